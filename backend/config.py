@@ -1,3 +1,4 @@
+import json
 import os
 from pathlib import Path
 from dotenv import load_dotenv
@@ -26,6 +27,7 @@ OPENAI_TEMPERATURE = 0
 COSTS = {
     'gpt-3.5-turbo': {
         'input': 0.0015,
+        'cached_input': 0.00075,
         'output': 0.002
     },
     'embeddings': {
@@ -34,23 +36,80 @@ COSTS = {
     },
     'fine-tuned': {
         'input': 0.003,
+        'cached_input': 0.0015,
         'output': 0.006
     }
 }
 
-# OpenAI configuration
+# OpenAI configuration. A missing key is reported by the endpoint pool when
+# a request needs it, so cassette replay and local-only tools run without one.
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("❌ OPENAI_API_KEY not found in environment variables. Please add it to your .env file.")
+
+# Optional pool of API keys / base URLs that requests are spread over.
+# OPENAI_ENDPOINTS is a JSON list, inline or in a file, of
+# {"name": ..., "api_key" or "api_key_env": ..., "base_url": ...}
+OPENAI_ENDPOINTS = os.getenv("OPENAI_ENDPOINTS")
+if OPENAI_ENDPOINTS:
+    if not OPENAI_ENDPOINTS.lstrip().startswith('['):
+        OPENAI_ENDPOINTS = Path(OPENAI_ENDPOINTS).read_text()
+    OPENAI_ENDPOINTS = json.loads(OPENAI_ENDPOINTS)
+    for endpoint in OPENAI_ENDPOINTS:
+        if 'api_key_env' in endpoint:
+            endpoint['api_key'] = os.getenv(endpoint['api_key_env'])
+else:
+    OPENAI_ENDPOINTS = [{"name": "default", "api_key": OPENAI_API_KEY, "base_url": os.getenv("OPENAI_BASE_URL")}]
 
 MODEL = "gpt-3.5-turbo"
+EMBEDDING_MODEL = "text-embedding-ada-002"
 TEMPERATURE = 0
 
+# Tweet pre-normalization applied ahead of every extractor
+TWEET_NORMALIZATION = {
+    'enabled': True,
+    'shorten_urls': True,       # replace links with their domain
+    'max_repeat': 3,            # longest run of one repeated character or emoji
+    'max_hashtags': 3,          # hashtags kept per chain
+    'max_other_mentions': 2,    # @mentions of non-airline accounts kept
+    'max_tokens': 80,           # token budget per tweet, 0 for no limit
+}
+
+# Logging: records queued before new ones are dropped, share of per-request
+# events written to the log and seconds between progress lines
+LOG_QUEUE_SIZE = 10000
+LOG_EVENT_SAMPLE_RATE = 0.01
+PROGRESS_INTERVAL = 5.0
+
+# Throughput settings, overridden by the profile written by --autotune
+TUNING_PROFILE_PATH = OUTPUT_DIR / "tuning_profile.json"
+DEFAULT_TUNING = {
+    'concurrency': 1,           # prompt-based requests in flight
+    'packing': 1,               # tweets per prompt-based request
+    'embedding_batch_size': 1,  # tweets per embeddings request
+}
+
+# Tweet-length buckets (characters, upper bound) used to slice reports
+TWEET_LENGTH_BUCKETS = {'short': 80, 'medium': 160, 'long': None}
+
+# Request hedging: duplicate a request still running at this latency
+# percentile, for at most HEDGE_BUDGET of all requests
+HEDGE_PERCENTILE = 95
+HEDGE_BUDGET = 0.05
+HEDGE_INITIAL_DELAY = 2.0  # seconds, used until HEDGE_MIN_SAMPLES latencies are seen
+HEDGE_MIN_SAMPLES = 20
+
 # Directory configuration
 DATA_DIR = ROOT_DIR / "data"
 OUTPUT_DIR = ROOT_DIR / "output"
 LOG_DIR = ROOT_DIR / "logs"
+RESULTS_STORE_DIR = OUTPUT_DIR / "results_store"
+LOCAL_MODEL_PATH = OUTPUT_DIR / "local_ml_model.joblib"
+DATASET_CACHE_DIR = OUTPUT_DIR / "dataset_cache"
+FINE_TUNED_REGISTRY_PATH = OUTPUT_DIR / "fine_tuned_models.json"
+# Digests of the training examples each fine-tuned model was trained on
+FINE_TUNED_EXAMPLES_PATH = OUTPUT_DIR / "fine_tuned_examples.json"
+# Smallest training file the fine-tuning API accepts
+FINE_TUNING_MIN_EXAMPLES = 10
 
 # Ensure directories exist
-for directory in [DATA_DIR, OUTPUT_DIR, LOG_DIR]:
+for directory in [DATA_DIR, OUTPUT_DIR, LOG_DIR, RESULTS_STORE_DIR]:
     directory.mkdir(exist_ok=True)
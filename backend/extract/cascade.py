@@ -0,0 +1,238 @@
+from concurrent.futures import ThreadPoolExecutor
+from openai.types import CompletionUsage
+from utils.openai_client import get_chat_completion, get_cached_tokens, get_cost
+from utils.metrics_tracker import ExtractionMetrics
+from utils.labels import LabelArray
+from utils.string_matcher import match_airline_name
+from utils.canonicalize import canonical_names, canonicalize, NO_AIRLINE
+from utils.profiler import span
+from .prompts import PROMPTS
+from .embeddings import learn_from_training
+from .fine_tuned import model_prompt_format, prompt_template, parse_answer
+from .local_ml import predict_with_confidence
+from config import MODEL, OUTPUT_DIR, LOCAL_MODEL_PATH, TRAIN_DATA_PATH
+import itertools
+import json
+import logging
+import math
+import time
+from utils.log_pipeline import track
+from utils.tuning import get_tuning
+
+# Cheapest stage first; the last stage always answers. local-ml makes no API call.
+CASCADE_STAGES = ["local-ml", "zero-shot", "few-shot", "fine-tuned"]
+DEFAULT_THRESHOLDS = {"local-ml": 0.95, "zero-shot": 0.9, "few-shot": 0.85}
+# Usage reported for the local stage
+NO_USAGE = CompletionUsage(prompt_tokens=0, completion_tokens=0, total_tokens=0)
+THRESHOLDS_FILE = OUTPUT_DIR / "cascade_thresholds.json"
+
+def load_thresholds():
+    """Load tuned thresholds, falling back to the defaults."""
+    thresholds = dict(DEFAULT_THRESHOLDS)
+    if THRESHOLDS_FILE.exists():
+        with open(THRESHOLDS_FILE) as f:
+            # Stages added since the thresholds were tuned keep their defaults
+            thresholds.update(json.load(f)['thresholds'])
+    return thresholds
+
+def active_stages(model_id=None):
+    """Cascade stages usable with the given arguments."""
+    local_ml = LOCAL_MODEL_PATH.exists() or TRAIN_DATA_PATH.exists()
+    return [stage for stage in CASCADE_STAGES
+            if (stage != "fine-tuned" or model_id) and (stage != "local-ml" or local_ml)]
+
+def _stage_cost(usage, stage):
+    return get_cost(usage, 'fine-tuned' if stage == "fine-tuned" else MODEL)
+
+def run_stage(tweet, stage, model_id=None):
+    """Run a single cascade stage and return (result, token_prob, usage, elapsed)."""
+    start = time.time()
+    if stage == "local-ml":
+        with span("local_predict", stage=stage):
+            (result,), (confidence,) = predict_with_confidence([tweet])
+        return result, confidence, NO_USAGE, time.time() - start
+
+    # The fine-tuned stage must be asked in the format its model was trained on
+    prompt_format = model_prompt_format(model_id) if stage == "fine-tuned" else None
+    template = prompt_template(prompt_format) if prompt_format else PROMPTS[stage]
+    with span("stage", stage=stage):
+        response = get_chat_completion(template.messages(tweet),
+                                       model=model_id if stage == "fine-tuned" else MODEL,
+                                       logprobs=True)
+    choice = response.choices[0]
+    result = choice.message.content.strip()
+    if prompt_format:
+        result = parse_answer(result, prompt_format)
+
+    # Geometric mean of the token probabilities of the answer
+    token_prob = 1.0
+    if choice.logprobs and choice.logprobs.content:
+        logprobs = [token.logprob for token in choice.logprobs.content]
+        token_prob = math.exp(sum(logprobs) / len(logprobs))
+
+    return result, token_prob, response.usage, time.time() - start
+
+def score_confidence(result, token_prob, known_airlines):
+    """
+    Confidence in a stage answer from format validity, agreement with the
+    known-airline list and the model's own token probabilities.
+    """
+    answer = (result or '').strip()
+    if not answer or len(answer) > 120:
+        return 0.0
+    names = canonical_names(answer)
+    if not names:
+        return 0.0
+    if names == [NO_AIRLINE]:
+        return token_prob
+
+    known = set(known_airlines)
+    agreement = sum(name in known for name in names) / len(names)
+    return agreement * token_prob
+
+def extract_airlines_cascade(tweets, model_id=None, thresholds=None, track_metrics=True):
+    """Extract airlines with the cheapest stage that is confident enough."""
+    if not isinstance(tweets, list):
+        tweets = [tweets]
+
+    stages = active_stages(model_id)
+    thresholds = thresholds or load_thresholds()
+    known_airlines = learn_from_training()
+
+    start_time = time.time()
+    results = LabelArray()
+    total_tokens = 0
+    input_tokens = 0
+    cached_input_tokens = 0
+    costs = []
+    stage_stats = {stage: {'attempted': 0, 'accepted': 0, 'cost': 0.0, 'time': 0.0} for stage in stages}
+
+    latencies = []
+
+    def run_tweet(tweet):
+        """Escalate one tweet through the stages; returns its answer and per-stage attempts."""
+        attempts = []
+        for i, stage in enumerate(stages):
+            result, token_prob, usage, elapsed = run_stage(tweet, stage, model_id)
+            is_last = i == len(stages) - 1
+            confidence = score_confidence(result, token_prob, known_airlines)
+            accepted = is_last or confidence >= thresholds.get(stage, 1.0)
+            attempts.append((stage, usage, elapsed, accepted))
+            if accepted:
+                return result, attempts
+            logging.debug(f"Escalating from {stage} (confidence {confidence:.2f})")
+
+    # Tweets escalate independently, so they run concurrently like the prompt-based methods
+    concurrency = get_tuning()['concurrency']
+    if concurrency > 1 and len(tweets) > 1:
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        outcomes = executor.map(run_tweet, tweets)
+    else:
+        executor = None
+        outcomes = map(run_tweet, tweets)
+
+    try:
+        for result, attempts in track(outcomes, "Processing", total=len(tweets)):
+            tweet_cost = 0.0
+            tweet_time = 0.0
+            for stage, usage, elapsed, accepted in attempts:
+                cost = _stage_cost(usage, stage)
+                total_tokens += usage.total_tokens
+                input_tokens += usage.prompt_tokens
+                cached_input_tokens += get_cached_tokens(usage)
+                tweet_cost += cost
+                tweet_time += elapsed
+                stats = stage_stats[stage]
+                stats['attempted'] += 1
+                stats['accepted'] += accepted
+                stats['cost'] += cost
+                stats['time'] += elapsed
+            results.append(result)
+            costs.append(tweet_cost)
+            latencies.append(tweet_time)
+    finally:
+        if executor:
+            executor.shutdown()
+
+    if track_metrics:
+        metrics = ExtractionMetrics(
+            method_name="Cascade",
+            total_tokens=total_tokens,
+            total_time=time.time() - start_time,
+            total_tweets=len(tweets),
+            exact_matches=0,  # Updated by main process
+            similarity_scores=[],  # Updated by main process
+            costs=costs,
+            latencies=latencies,
+            stage_stats=stage_stats,
+            input_tokens=input_tokens,
+            cached_input_tokens=cached_input_tokens
+        )
+        return results, metrics
+
+    return results[0] if len(tweets) == 1 else results
+
+def simulate_cascade(observations, stages, thresholds):
+    """Replay recorded stage answers under the given thresholds."""
+    correct = 0
+    cost = 0.0
+    latency = 0.0
+    for row in observations:
+        for i, stage in enumerate(stages):
+            answer = row[stage]
+            cost += answer['cost']
+            latency += answer['time']
+            if i == len(stages) - 1 or answer['confidence'] >= thresholds[stage]:
+                correct += answer['correct']
+                break
+    total = len(observations)
+    return correct / total * 100, cost, latency
+
+def tune_thresholds(data, target_accuracy=90.0, model_id=None, grid=None):
+    """
+    Pick stage thresholds that reach the target accuracy at minimum cost
+    (then latency) on a labelled dataset, and save them for later runs.
+    """
+    stages = active_stages(model_id)
+    grid = grid or [round(0.05 * step, 2) for step in range(21)]
+    known_airlines = learn_from_training()
+
+    # Every stage is run once per tweet; the search itself is offline
+    observations = []
+    for tweet, expected in track(zip(data['tweet'], data['airlines']), "Calibrating", total=len(data)):
+        row = {}
+        for stage in stages:
+            result, token_prob, usage, elapsed = run_stage(tweet, stage, model_id)
+            is_exact, _ = match_airline_name(canonicalize(result), expected)
+            row[stage] = {
+                'confidence': score_confidence(result, token_prob, known_airlines),
+                'correct': is_exact,
+                'cost': _stage_cost(usage, stage),
+                'time': elapsed
+            }
+        observations.append(row)
+
+    best = None
+    for values in itertools.product(grid, repeat=len(stages) - 1):
+        thresholds = dict(zip(stages[:-1], values))
+        accuracy, cost, latency = simulate_cascade(observations, stages, thresholds)
+        meets_target = accuracy >= target_accuracy
+        key = (not meets_target, cost if meets_target else -accuracy, latency)
+        if best is None or key < best[0]:
+            best = (key, thresholds, accuracy, cost, latency)
+
+    _, thresholds, accuracy, cost, latency = best
+    with open(THRESHOLDS_FILE, 'w') as f:
+        json.dump({
+            'thresholds': thresholds,
+            'stages': stages,
+            'target_accuracy': target_accuracy,
+            'accuracy': accuracy,
+            'cost': cost,
+            'latency': latency
+        }, f, indent=2)
+
+    print(f"\n✅ Cascade thresholds saved to {THRESHOLDS_FILE}")
+    print(f"🎯 Accuracy: {accuracy:.1f}% (target {target_accuracy:.1f}%)")
+    print(f"💰 Cost: ${cost:.4f} for {len(observations)} tweets")
+    return thresholds
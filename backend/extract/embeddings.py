@@ -1,95 +1,108 @@
-from utils.openai_client import client
+from utils.openai_client import get_chat_completion, get_embeddings, get_cached_tokens, get_cost
 from utils.metrics_tracker import ExtractionMetrics
+from utils.labels import LabelArray
 import numpy as np
 from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
 from pathlib import Path
 import time
-from tqdm import tqdm
+from utils.log_pipeline import track
 from config import TRAIN_DATA_PATH
+from utils.profiler import span
+from utils.tuning import get_tuning
+from utils.canonicalize import canonical_names
+from .prompts import get_prompt
+from functools import lru_cache
+from utils.data_loader import _file_stamp
 
-def learn_from_training(training_file=None):
-    """Learn common airline patterns from training data."""
-    if training_file is None:
-        training_file = TRAIN_DATA_PATH
+@lru_cache(maxsize=None)
+def _training_airlines(training_file, stamp):
     df = pd.read_csv(training_file)
     unique_airlines = set()
     
     # Extract unique airline names from training data
-    for airlines in df['airlines'].dropna():
-        airlines = airlines.strip('[]\'\"').split(',')
-        unique_airlines.update([airline.strip() for airline in airlines])
+    for airlines in df['airlines'].dropna().unique():
+        unique_airlines.update(canonical_names(airlines))
+    unique_airlines.discard("No airline found")
     
-    return list(unique_airlines)
+    # Sorted so prompts built from this list keep a stable, cacheable prefix
+    return tuple(sorted(unique_airlines))
+
+def learn_from_training(training_file=None):
+    """
+    Learn common airline patterns from training data. The file is only
+    re-read when it changes, so per-tweet callers such as --stream are cheap.
+    """
+    if training_file is None:
+        training_file = TRAIN_DATA_PATH
+    return list(_training_airlines(str(training_file), _file_stamp(training_file)))
 
 def extract_airlines_embeddings(tweets, track_metrics=True):
     """Extract airlines using semantic similarity and embeddings."""
     if not isinstance(tweets, list):
         tweets = [tweets]
         
-    try:
-        # Load training data using the correct path
-        training_data = pd.read_csv(TRAIN_DATA_PATH)
-    except FileNotFoundError:
+    if not TRAIN_DATA_PATH.exists():
         print(f"Training data file not found at {TRAIN_DATA_PATH}")
         return
     
     start_time = time.time()
-    results = []
+    results = LabelArray()
     total_tokens = 0
+    input_tokens = 0
+    cached_input_tokens = 0
     costs = []
+    latencies = []
     
     # Get known airlines once for all tweets
     known_airlines = learn_from_training()
+    prompt_template = get_prompt("embeddings", known_airlines=', '.join(known_airlines))
     
-    for tweet in tqdm(tweets, desc="Processing", leave=False):
-        # Get embedding for the tweet
-        tweet_emb_response = client.embeddings.create(
-            input=tweet,
-            model="text-embedding-ada-002"
-        )
-        tweet_embedding = tweet_emb_response.data[0].embedding
-        tweet_tokens = tweet_emb_response.usage.total_tokens
-        
+    # Embed tweets in batches; a batch's tokens are shared by its tweets
+    batch_size = get_tuning()['embedding_batch_size']
+    tweet_embeddings = []
+    tweet_token_counts = []
+    tweet_seconds = []
+    for start in range(0, len(tweets), batch_size):
+        batch = tweets[start:start + batch_size]
+        batch_start = time.perf_counter()
+        tweet_emb_response = get_embeddings(batch)
+        tweet_embeddings += [item.embedding for item in sorted(tweet_emb_response.data, key=lambda item: item.index)]
+        tweet_token_counts += [tweet_emb_response.usage.total_tokens / len(batch)] * len(batch)
+        tweet_seconds += [(time.perf_counter() - batch_start) / len(batch)] * len(batch)
+    
+    for tweet, tweet_embedding, tweet_tokens, seconds in track(zip(tweets, tweet_embeddings, tweet_token_counts,
+                                                                   tweet_seconds),
+                                                               "Processing", total=len(tweets)):
+        tweet_start = time.perf_counter()
         # Use the chat API with context
-        prompt = f"""Extract airline names from this tweet. Common airlines include: {', '.join(known_airlines)}
+        chat_response = get_chat_completion(prompt_template.messages(tweet))
         
-        Tweet: '{tweet}'
-        Airlines (one per line):"""
-        
-        chat_response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "Extract potential airline names from the tweet, one per line."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0
-        )
-        
-        potential_airlines = chat_response.choices[0].message.content.strip().split('\n')
+        with span("parse_response"):
+            potential_airlines = chat_response.choices[0].message.content.strip().split('\n')
         
         # Get embeddings for potential airlines
-        airlines_emb_response = client.embeddings.create(
-            input=potential_airlines,
-            model="text-embedding-ada-002"
-        )
+        airlines_emb_response = get_embeddings(potential_airlines)
         
         # Track metrics
         if track_metrics:
-            total_tokens += (tweet_tokens + 
-                           chat_response.usage.total_tokens + 
-                           airlines_emb_response.usage.total_tokens)
+            total_tokens += round(tweet_tokens +
+                                  chat_response.usage.total_tokens +
+                                  airlines_emb_response.usage.total_tokens)
             embedding_cost = (tweet_tokens + airlines_emb_response.usage.total_tokens) * 0.0001 / 1000
-            chat_cost = ((chat_response.usage.prompt_tokens * 0.0015 + 
-                         chat_response.usage.completion_tokens * 0.002) / 1000)
+            chat_cost = get_cost(chat_response.usage)
             costs.append(embedding_cost + chat_cost)
+            input_tokens += chat_response.usage.prompt_tokens
+            cached_input_tokens += get_cached_tokens(chat_response.usage)
+            latencies.append(seconds + time.perf_counter() - tweet_start)
         
         # Find strong matches
         matches = []
-        for airline, airline_emb in zip(potential_airlines, airlines_emb_response.data):
-            similarity = cosine_similarity([tweet_embedding], [airline_emb.embedding])[0][0]
-            if similarity > 0.8:
-                matches.append(airline.strip())
+        with span("similarity"):
+            for airline, airline_emb in zip(potential_airlines, airlines_emb_response.data):
+                similarity = cosine_similarity([tweet_embedding], [airline_emb.embedding])[0][0]
+                if similarity > 0.8:
+                    matches.append(airline.strip())
         
         results.append(', '.join(matches) if matches else 'No airline found')
     
@@ -101,7 +114,10 @@ def extract_airlines_embeddings(tweets, track_metrics=True):
             total_tweets=len(tweets),
             exact_matches=0,  # Updated by main process
             similarity_scores=[],  # Updated by main process
-            costs=costs
+            costs=costs,
+            latencies=latencies,
+            input_tokens=input_tokens,
+            cached_input_tokens=cached_input_tokens
         )
         return results, metrics
     
@@ -1,41 +1,159 @@
-from utils.openai_client import client
+from utils.openai_client import client, get_chat_completion, get_cached_tokens, get_cost
 import pandas as pd
+import hashlib
 import json
+import random
 from pathlib import Path
 import time
 import logging
 import sys
 from utils.metrics_tracker import ExtractionMetrics
-from tqdm import tqdm
+from utils.labels import LabelArray
+from utils.profiler import span
+from utils.canonicalize import canonicalize, split_airlines, NO_AIRLINE
+from .prompts import PROMPTS, count_tokens
+from .normalize import active_normalization, normalize_tweets
+from config import FINE_TUNED_REGISTRY_PATH, FINE_TUNED_EXAMPLES_PATH, FINE_TUNING_MIN_EXAMPLES, TRAIN_DATA_PATH
+from utils.log_pipeline import track, log_event
 
 logger = logging.getLogger(__name__)
 
-def prepare_training_data(training_file=None):
-    """Convert training data to fine-tuning format for chat models."""
+# Prompt formats a model can be trained with. "compact" sends the bare tweet
+# and answers with names separated by "|" (or "none").
+PROMPT_FORMATS = ("standard", "compact")
+COMPACT_SEPARATOR = "|"
+COMPACT_NONE = "none"
+# Model ID suffixes, so the format can be recovered even without the registry
+MODEL_SUFFIXES = {"standard": "airline-extractor", "compact": "airline-compact"}
+BASE_MODEL = "gpt-3.5-turbo"
+
+def prompt_template(prompt_format):
+    """Prompt used to train and query models of a format."""
+    return PROMPTS["fine-tuned-compact" if prompt_format == "compact" else "fine-tuned"]
+
+def format_answer(airlines, prompt_format):
+    """Training target for a canonical airline label."""
+    if prompt_format != "compact":
+        return airlines
+    return COMPACT_NONE if airlines == NO_AIRLINE else COMPACT_SEPARATOR.join(split_airlines(airlines))
+
+def parse_answer(answer, prompt_format):
+    """Convert a model answer back to the comma-separated form."""
+    if prompt_format != "compact":
+        return answer
+    names = [name.strip() for name in answer.split(COMPACT_SEPARATOR) if name.strip()]
+    if not names or names == [COMPACT_NONE]:
+        return NO_AIRLINE
+    return ', '.join(names)
+
+def _load_json(path):
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _load_registry():
+    return _load_json(FINE_TUNED_REGISTRY_PATH)
+
+def example_digest(example):
+    """
+    Content hash of one training example. A relabelled or edited row gets a
+    new digest, so it counts as a new example.
+    """
+    return hashlib.sha1(json.dumps(example, sort_keys=True).encode()).hexdigest()[:16]
+
+def register_model(model_id, prompt_format, training_file=None, parent=None, examples=None, trained_tokens=None):
+    """Record a model's prompt format, the model it continued from and the examples it was trained on."""
+    registry = _load_registry()
+    # Top-up examples the parent already saw are not new
+    seen = trained_examples(parent) if parent else set()
+    registry[model_id] = {
+        'prompt_format': prompt_format,
+        'training_file': str(training_file) if training_file else None,
+        'parent': parent,
+        'base_model': registry.get(parent, {}).get('base_model', parent or BASE_MODEL),
+        'new_examples': len(set(examples) - seen) if examples is not None else None,
+        'total_examples': len(seen | set(examples)) if examples is not None else None,
+        'trained_tokens': trained_tokens,
+        # Inference normalizes tweets the same way; a change needs a new model
+        'normalization': active_normalization(),
+        'created': time.strftime("%Y-%m-%dT%H:%M:%S")
+    }
+    with open(FINE_TUNED_REGISTRY_PATH, 'w') as f:
+        json.dump(registry, f, indent=2)
+    if examples is not None:
+        trained = _load_json(FINE_TUNED_EXAMPLES_PATH)
+        trained[model_id] = sorted(examples)
+        with open(FINE_TUNED_EXAMPLES_PATH, 'w') as f:
+            json.dump(trained, f)
+
+def model_lineage(model_id):
+    """Registered models from the first one trained to model_id, each continuing the one before."""
+    registry = _load_registry()
+    lineage = []
+    while model_id in registry and model_id not in lineage:
+        lineage.insert(0, model_id)
+        model_id = registry[model_id].get('parent')
+    return lineage
+
+def trained_examples(model_id):
+    """Digests of every example model_id and its ancestors were trained on."""
+    trained = _load_json(FINE_TUNED_EXAMPLES_PATH)
+    return set().union(*(trained.get(ancestor, []) for ancestor in model_lineage(model_id)))
+
+def latest_model(prompt_format):
+    """
+    Most recently registered model of a format whose training examples are
+    known and whose tweets were normalized with the current options.
+    """
+    trained = _load_json(FINE_TUNED_EXAMPLES_PATH)
+    normalization = active_normalization()
+    candidates = [model_id for model_id, entry in _load_registry().items()
+                  if entry.get('prompt_format') == prompt_format and model_id in trained
+                  and entry.get('normalization') == normalization]
+    return candidates[-1] if candidates else None
+
+def format_lineage(model_id):
+    """One line per model in a lineage with its new and total examples."""
+    registry = _load_registry()
+    lines = []
+    for depth, ancestor in enumerate(model_lineage(model_id)):
+        entry = registry[ancestor]
+        lines.append(f"{'  ' * depth}{'└─ ' if depth else ''}{ancestor}: "
+                     f"+{entry.get('new_examples') or 0} examples ({entry.get('total_examples') or 0} total), "
+                     f"{entry.get('trained_tokens') or 0:,} trained tokens")
+    return "\n".join(lines)
+
+def model_prompt_format(model_id):
+    """Prompt format a fine-tuned model expects, so inference matches training."""
+    entry = _load_registry().get(model_id)
+    if entry:
+        return entry['prompt_format']
+    return "compact" if model_id and MODEL_SUFFIXES["compact"] in model_id else "standard"
+
+
+def prepare_training_data(training_file=None, prompt_format="standard", exclude=None):
+    """
+    Convert training data to fine-tuning format for chat models. Tweets are
+    normalized as they will be at inference. Examples whose digest is in
+    exclude (already trained on) are left out.
+    """
     if training_file is None:
-        training_file = Path(__file__).parent.parent.parent / 'data' / 'airline_train.csv'
+        training_file = TRAIN_DATA_PATH
     
     print(f"\n🔄 Loading training data from {training_file}")
     df = pd.read_csv(training_file)
     print(f"📊 Found {len(df)} training examples")
     
+    tweets, _ = normalize_tweets(df['tweet'].astype(str))
     training_data = []
-    for idx, row in enumerate(df.iterrows(), 1):
-        _, row = row  # Unpack the row
-        airlines = row['airlines'].strip('[]\'\"')
+    for idx, (row, tweet) in enumerate(zip(df.itertuples(index=False), tweets), 1):
+        airlines = canonicalize(row.airlines if isinstance(row.airlines, str) else NO_AIRLINE)
         training_example = {
-            "messages": [
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that extracts airline names from tweets. Only respond with the official airline names, separated by commas if there are multiple airlines."
-                },
-                {
-                    "role": "user",
-                    "content": f"Extract airlines from this tweet: {row['tweet']}"
-                },
+            "messages": prompt_template(prompt_format).messages(tweet) + [
                 {
                     "role": "assistant",
-                    "content": airlines
+                    "content": format_answer(airlines, prompt_format)
                 }
             ]
         }
@@ -43,7 +161,18 @@ def prepare_training_data(training_file=None):
         if idx % 100 == 0:
             print(f"⏳ Processed {idx}/{len(df)} examples...")
     
-    output_file = Path(__file__).parent.parent.parent / 'data' / 'fine_tuning.jsonl'
+    suffix = '' if prompt_format == "standard" else f"_{prompt_format}"
+    if exclude is not None:
+        new_data = [example for example in training_data if example_digest(example) not in exclude]
+        print(f"🔍 {len(new_data)} new or changed examples, {len(training_data) - len(new_data)} already trained on")
+        if 0 < len(new_data) < FINE_TUNING_MIN_EXAMPLES:
+            # Top up to the API minimum with examples the parent has already seen
+            seen = [example for example in training_data if example_digest(example) in exclude]
+            random.Random(0).shuffle(seen)
+            new_data += seen[:FINE_TUNING_MIN_EXAMPLES - len(new_data)]
+        training_data = new_data
+        suffix += "_delta"
+    output_file = Path(__file__).parent.parent.parent / 'data' / f'fine_tuning{suffix}.jsonl'
     output_file.parent.mkdir(parents=True, exist_ok=True)
     
     print(f"\n💾 Saving training data to {output_file}")
@@ -54,8 +183,11 @@ def prepare_training_data(training_file=None):
     print(f"✅ Successfully created training file with {len(training_data)} examples\n")
     return output_file
 
-def create_fine_tuned_model(training_file):
-    """Create a new fine-tuned model using the training data."""
+def create_fine_tuned_model(training_file, prompt_format="standard", parent=None):
+    """
+    Create a new fine-tuned model using the training data, continuing from
+    the parent fine-tuned model if one is given.
+    """
     try:
         print("\n🚀 Starting fine-tuning process...")
         print("Step 1/4: Uploading training file to OpenAI...")
@@ -70,8 +202,8 @@ def create_fine_tuned_model(training_file):
         print("\nStep 2/4: Creating fine-tuning job...")
         job = client.fine_tuning.jobs.create(
             training_file=file_id,
-            model="gpt-3.5-turbo",
-            suffix="airline-extractor"
+            model=parent or BASE_MODEL,
+            suffix=MODEL_SUFFIXES[prompt_format]
         )
         print(f"✅ Job created successfully (ID: {job.id})")
         
@@ -100,8 +232,13 @@ def create_fine_tuned_model(training_file):
         if job.status == 'succeeded':
             print(f"\n✨ Success! Your new fine-tuned model is ready:")
             print(f"📎 Model ID: {job.fine_tuned_model}")
-            print(f"🎯 Base Model: GPT-3.5 Turbo")
+            print(f"🎯 Base Model: {parent or 'GPT-3.5 Turbo'}")
             print(f"📊 Training Examples: {job.training_file}")
+            print(f"📝 Prompt Format: {prompt_format}")
+            with open(training_file) as f:
+                examples = {example_digest(json.loads(line)) for line in f if line.strip()}
+            register_model(job.fine_tuned_model, prompt_format, training_file, parent=parent,
+                           examples=examples, trained_tokens=getattr(job, 'trained_tokens', None))
             return job.fine_tuned_model
         else:
             print(f"\n❌ Fine-tuning failed with status: {job.status}")
@@ -149,9 +286,13 @@ def extract_airlines_fine_tuned(tweets, model_id=None, track_metrics=True):
         tweets = [tweets]
         
     start_time = time.time()
-    results = []
+    results = LabelArray()
     total_tokens = 0
+    input_tokens = 0
+    cached_input_tokens = 0
     costs = []
+    latencies = []
+    format_tokens_saved = 0
     
     try:
         if not model_id:
@@ -160,45 +301,54 @@ def extract_airlines_fine_tuned(tweets, model_id=None, track_metrics=True):
                 raise ValueError("No fine-tuned models available")
             model_id = available_models[0]
         
+        prompt_format = model_prompt_format(model_id)
+        template = prompt_template(prompt_format)
+        entry = _load_registry().get(model_id)
+        if entry and entry.get('normalization') != active_normalization():
+            logging.warning(f"{model_id} was trained with different tweet normalization; "
+                            f"retrain with --train-model to match")
+        # Prompt tokens a compact model saves on every request
+        static_saved = PROMPTS["fine-tuned"].static_tokens - template.static_tokens
+        
         # Only print model ID once at the start
         if not hasattr(extract_airlines_fine_tuned, 'model_printed'):
             print(f"\n🎯 Using fine-tuned model: {model_id}")
             extract_airlines_fine_tuned.model_printed = True
             
-        for tweet in tqdm(tweets, desc="Processing", leave=False):
-            response = client.chat.completions.create(
-                model=model_id,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a helpful assistant that extracts airline names from tweets. Only respond with the official airline names, separated by commas if there are multiple airlines."
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Extract airlines from this tweet: {tweet}"
-                    }
-                ],
-                temperature=0
-            )
+        for tweet in track(tweets, "Processing"):
+            with span("format_prompt"):
+                messages = template.messages(tweet)
+            request_start = time.perf_counter()
+            response = get_chat_completion(messages, model=model_id)
             
-            result = response.choices[0].message.content.strip()
+            with span("parse_response"):
+                answer = response.choices[0].message.content.strip()
+                result = parse_answer(answer, prompt_format)
             results.append(result)
-            print(f"✅ Successfully extracted: {result}")
+            log_event("extracted", method="fine-tuned", model=model_id, result=result)
             
             if track_metrics:
                 total_tokens += response.usage.total_tokens
-                cost = (response.usage.prompt_tokens * 0.003 + response.usage.completion_tokens * 0.006) / 1000
-                costs.append(cost)
+                input_tokens += response.usage.prompt_tokens
+                cached_input_tokens += get_cached_tokens(response.usage)
+                costs.append(get_cost(response.usage, 'fine-tuned'))
+                latencies.append(time.perf_counter() - request_start)
+                if prompt_format == "compact":
+                    format_tokens_saved += static_saved + count_tokens(result) - count_tokens(answer)
         
         if track_metrics:
             metrics = ExtractionMetrics(
-                method_name="Fine-tuned",
+                method_name="Fine-tuned" + (" (compact)" if prompt_format == "compact" else ""),
                 total_tokens=total_tokens,
                 total_time=time.time() - start_time,
                 total_tweets=len(tweets),
                 exact_matches=0,  # Updated by main process
                 similarity_scores=[],  # Updated by main process
-                costs=costs
+                costs=costs,
+                latencies=latencies,
+                input_tokens=input_tokens,
+                cached_input_tokens=cached_input_tokens,
+                format_tokens_saved=format_tokens_saved
             )
             return results, metrics
             
@@ -208,17 +358,35 @@ def extract_airlines_fine_tuned(tweets, model_id=None, track_metrics=True):
         print(f"\n❌ Error in extraction: {str(e)}")
         raise
 
-def train_new_model():
-    """Create a new fine-tuned model and return its ID."""
+def _count_lines(path):
+    with open(path) as f:
+        return sum(1 for line in f if line.strip())
+
+def train_new_model(prompt_format="standard", incremental=True):
+    """
+    Create a new fine-tuned model and return its ID. With incremental, only
+    examples the latest model of the same format hasn't seen are uploaded and
+    training continues from that model.
+    """
     try:
+        parent = latest_model(prompt_format) if incremental else None
+        if parent and not verify_model_exists(parent):
+            print(f"\n⚠️  Previous model {parent} is no longer available, training from {BASE_MODEL}")
+            parent = None
+        
         print("\n🔄 Preparing training data...")
-        training_file = prepare_training_data()
+        exclude = trained_examples(parent) if parent else None
+        training_file = prepare_training_data(prompt_format=prompt_format, exclude=exclude)
+        if parent and not _count_lines(training_file):
+            print(f"\n✅ No new training examples; {parent} is up to date")
+            return parent
         
-        print("\n🚀 Training new model...")
-        model_id = create_fine_tuned_model(training_file)
+        print(f"\n🚀 Training {'from ' + parent if parent else 'new model'}...")
+        model_id = create_fine_tuned_model(training_file, prompt_format, parent=parent)
         
         print(f"\n✅ Successfully created model: {model_id}")
+        print(format_lineage(model_id))
         return model_id
     except Exception as e:
         print(f"\n❌ Error training model: {str(e)}")
-        raise
\ No newline at end of file
+        raise
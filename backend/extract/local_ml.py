@@ -0,0 +1,132 @@
+import json
+import logging
+import time
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.multiclass import OneVsRestClassifier
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import MultiLabelBinarizer
+from config import TRAIN_DATA_PATH, LOCAL_MODEL_PATH
+from utils.canonicalize import NO_AIRLINE, canonical_names
+from utils.data_loader import _file_stamp
+from utils.labels import LabelArray
+from utils.metrics_tracker import ExtractionMetrics
+from utils.profiler import span
+from .normalize import active_normalization, normalize_tweets
+
+# Probability above which an airline is included in the prediction
+DECISION_THRESHOLD = 0.5
+
+_model = None
+
+def training_stamp(training_file=None):
+    """
+    Identifies the data a model is fit on: the training file's mtime and
+    size, and the tweet normalization applied to it.
+    """
+    training_file = training_file or TRAIN_DATA_PATH
+    return json.dumps({'training_file': _file_stamp(training_file), 'normalization': active_normalization()},
+                      sort_keys=True, default=str)
+
+def train_local_model(training_file=None, model_path=None):
+    """
+    Train a character n-gram TF-IDF + one-vs-rest logistic regression
+    classifier on the labelled training tweets and save it to disk.
+    """
+    training_file = training_file or TRAIN_DATA_PATH
+    model_path = model_path or LOCAL_MODEL_PATH
+    df = pd.read_csv(training_file)
+
+    # Each tweet maps to a set of canonical airlines; "No airline found" is the empty set
+    label_sets = [
+        [name for name in canonical_names(airlines) if name != NO_AIRLINE]
+        for airlines in df['airlines'].fillna(NO_AIRLINE)
+    ]
+    binarizer = MultiLabelBinarizer()
+    targets = binarizer.fit_transform(label_sets)
+
+    pipeline = make_pipeline(
+        TfidfVectorizer(analyzer='char_wb', ngram_range=(2, 5), lowercase=True, sublinear_tf=True, min_df=2),
+        OneVsRestClassifier(LogisticRegression(max_iter=1000, class_weight='balanced'))
+    )
+    # Fit on tweets as extraction will see them
+    tweets, _ = normalize_tweets(df['tweet'].astype(str))
+    with span("train_local_model", rows=len(df)):
+        pipeline.fit(tweets, targets)
+
+    model = {'pipeline': pipeline, 'classes': list(binarizer.classes_), 'training_file': str(training_file),
+             'training_stamp': training_stamp(training_file)}
+    joblib.dump(model, model_path)
+    logging.info(f"Trained local classifier on {len(df)} tweets ({len(binarizer.classes_)} airlines) -> {model_path}")
+    return model
+
+def load_local_model():
+    """
+    Load the saved classifier, training it first if it doesn't exist yet or
+    if the training data or normalization changed since it was trained.
+    """
+    global _model
+    if _model is None and LOCAL_MODEL_PATH.exists():
+        _model = joblib.load(LOCAL_MODEL_PATH)
+    if _model is None:
+        print("🧠 Training local classifier...")
+        _model = train_local_model()
+    elif TRAIN_DATA_PATH.exists() and _model.get('training_stamp') != training_stamp():
+        print("🧠 Training data changed, retraining local classifier...")
+        _model = train_local_model()
+    return _model
+
+def _labels(probabilities, classes):
+    results = LabelArray()
+    for row in probabilities >= DECISION_THRESHOLD:
+        names = [classes[i] for i in row.nonzero()[0]]
+        results.append(', '.join(names) if names else NO_AIRLINE)
+    return results
+
+def predict_airlines(tweets, model=None):
+    """Predict the airline set of every tweet in one vectorized pass."""
+    model = model or load_local_model()
+    return _labels(model['pipeline'].predict_proba(list(tweets)), model['classes'])
+
+def predict_with_confidence(tweets, model=None):
+    """
+    Predictions plus a confidence per tweet: how decisive the least certain
+    per-airline decision was (1.0 when every probability is 0 or 1).
+    """
+    model = model or load_local_model()
+    probabilities = model['pipeline'].predict_proba(list(tweets))
+    confidences = np.maximum(probabilities, 1 - probabilities).min(axis=1)
+    return _labels(probabilities, model['classes']), confidences.tolist()
+
+def extract_airlines_local_ml(tweets, track_metrics=True):
+    """Extract airlines with the local classifier. Makes no API calls."""
+    if not isinstance(tweets, list):
+        tweets = [tweets]
+
+    start_time = time.time()
+    # An empty slice or shard has nothing to predict (and no per-tweet share)
+    results = LabelArray()
+    if tweets:
+        model = load_local_model()
+        with span("local_predict", tweets=len(tweets)):
+            results = predict_airlines(tweets, model)
+
+    if track_metrics:
+        elapsed = time.time() - start_time
+        metrics = ExtractionMetrics(
+            method_name="Local-ml",
+            total_tokens=0,
+            total_time=elapsed,
+            total_tweets=len(tweets),
+            exact_matches=0,  # Updated by main process
+            similarity_scores=[],  # Updated by main process
+            costs=[0.0] * len(tweets),
+            # One vectorized pass; each tweet gets an equal share
+            latencies=[elapsed / len(tweets)] * len(tweets) if tweets else []
+        )
+        return results, metrics
+
+    return results[0] if len(tweets) == 1 else results
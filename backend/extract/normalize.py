@@ -0,0 +1,99 @@
+import logging
+import re
+import pandas as pd
+from config import TWEET_NORMALIZATION
+from utils.canonicalize import is_airline_handle
+from .prompts import _get_encoding
+
+_URL_PATTERN = r'https?://(?:www\.)?([^/\s]+)\S*'
+_EMOJI = '\U0001F000-\U0001FAFF\u2600-\u27BF\uFE0F\u200D'
+_MENTION_PATTERN = re.compile(r'@(\w+)')
+
+# Bump when normalize_tweets output changes for the same options
+NORMALIZATION_VERSION = 2
+
+_enabled = TWEET_NORMALIZATION['enabled']
+
+def enable_normalization(enabled=True):
+    """Turn tweet pre-normalization on or off for the rest of the process."""
+    global _enabled
+    _enabled = enabled
+
+def active_normalization():
+    """Normalization options in effect, or None when normalization is off."""
+    if not _enabled or not TWEET_NORMALIZATION['enabled']:
+        return None
+    return {**TWEET_NORMALIZATION, 'version': NORMALIZATION_VERSION}
+
+def _limit_mentions(tweet, limit):
+    """Drop @mentions of non-airline accounts beyond the first `limit`."""
+    kept = 0
+
+    def replace(match):
+        nonlocal kept
+        if is_airline_handle(match.group(1)):
+            return match.group(0)
+        kept += 1
+        return match.group(0) if kept <= limit else ''
+
+    return _MENTION_PATTERN.sub(replace, tweet)
+
+def _token_counts(texts):
+    encoding = _get_encoding()
+    if encoding is None:
+        return [max(1, len(text) // 4) if text else 0 for text in texts]
+    return [len(tokens) for tokens in encoding.encode_ordinary_batch(texts)]
+
+def _truncate(texts, max_tokens):
+    """Cut every text to at most max_tokens tokens."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return [text[:max_tokens * 4] for text in texts]
+    return [
+        encoding.decode(tokens[:max_tokens]) if len(tokens) > max_tokens else text
+        for text, tokens in zip(texts, encoding.encode_ordinary_batch(texts))
+    ]
+
+def normalize_tweets(tweets, **options):
+    """
+    Strip tweet content that doesn't help identify an airline before it is
+    sent to a model: links are shortened to their domain, repeated
+    characters, emoji runs, hashtag chains and non-airline mentions are
+    limited, whitespace is collapsed and the result is cut to a token budget.
+    Options override TWEET_NORMALIZATION.
+
+    Returns the normalized tweets and a dict of token savings.
+    """
+    options = {**TWEET_NORMALIZATION, **options}
+    tweets = list(tweets)
+    if not _enabled or not options['enabled']:
+        return tweets, {}
+
+    # Object dtype keeps Python regex semantics (backreferences) in .str
+    text = pd.Series(tweets, dtype=object).fillna('').map(str).astype(object)
+    raw = text.tolist()
+    if options['shorten_urls']:
+        text = text.str.replace(_URL_PATTERN, r'\1', regex=True)
+    repeat = options['max_repeat']
+    if repeat:
+        text = text.str.replace(rf'(([{_EMOJI}]){{{repeat}}})[{_EMOJI}]+', r'\1', regex=True)
+        text = text.str.replace(rf'((.)\2{{{repeat - 1}}})\2+', r'\1', regex=True)
+    if options['max_hashtags']:
+        text = text.str.replace(rf'(#\w+(?:\s+#\w+){{{options["max_hashtags"] - 1}}})(?:\s+#\w+)+', r'\1', regex=True)
+    if options['max_other_mentions'] is not None:
+        text = text.map(lambda tweet: _limit_mentions(tweet, options['max_other_mentions']))
+    text = text.str.replace(r'\s+', ' ', regex=True).str.strip()
+
+    normalized = text.tolist()
+    if options['max_tokens']:
+        normalized = _truncate(normalized, options['max_tokens'])
+
+    stats = {
+        'tweets': len(tweets),
+        'changed': sum(before != after for before, after in zip(raw, normalized)),
+        'tokens_before': sum(_token_counts(raw)),
+        'tokens_after': sum(_token_counts(normalized))
+    }
+    logging.info(f"Normalized {stats['changed']}/{stats['tweets']} tweets, "
+                 f"{stats['tokens_before']} -> {stats['tokens_after']} tokens")
+    return normalized, stats
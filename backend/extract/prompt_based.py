@@ -1,41 +1,106 @@
-from utils.openai_client import get_response
+from concurrent.futures import ThreadPoolExecutor
+from utils.openai_client import get_chat_response, get_cached_tokens, get_cost
 from utils.metrics_tracker import ExtractionMetrics
-from .prompts import PROMPTS
+from utils.labels import LabelArray
+from utils.profiler import span
+from utils.log_pipeline import Progress
+from utils.tuning import get_tuning
+from .prompts import PROMPTS, parse_packed_answer
+from .structured import get_structured_response
+from .embeddings import learn_from_training
+import logging
 import time
-from tqdm import tqdm
 
-def extract_airlines_prompt(tweets, method, track_metrics=True):
-    """Extract airlines using prompt-based extraction."""
+def _extract_single(prompt_template, tweet):
+    with span("format_prompt"):
+        messages = prompt_template.messages(tweet)
+    result, usage = get_chat_response(messages, return_usage=True)
+    return [result], [usage]
+
+def _extract_packed(prompt_template, tweets):
+    """Ask about several tweets in one request, retrying unanswered ones alone."""
+    with span("format_prompt", packed=len(tweets)):
+        messages = prompt_template.packed_messages(tweets)
+    text, usage = get_chat_response(messages, return_usage=True)
+    results = parse_packed_answer(text, len(tweets))
+    usages = [usage]
+    for i, result in enumerate(results):
+        if result is None:
+            logging.info(f"Packed answer missed tweet {i + 1}/{len(tweets)}, asking again")
+            (results[i],), retry_usages = _extract_single(prompt_template, tweets[i])
+            usages += retry_usages
+    return results, usages
+
+def extract_airlines_prompt(tweets, method, track_metrics=True, structured=False, concurrency=None, packing=None):
+    """
+    Extract airlines using prompt-based extraction.
+    With structured=True the model answers with known-airline IDs via a tool call.
+    Concurrency and packing (tweets per request) default to the tuning profile.
+    """
     if not isinstance(tweets, list):
         tweets = [tweets]
-        
+
     start_time = time.time()
-    results = []
+    results = LabelArray()
     total_tokens = 0
+    input_tokens = 0
+    cached_input_tokens = 0
     costs = []
-    
+    latencies = []
+
     prompt_template = PROMPTS[method]
-    
-    for tweet in tqdm(tweets, desc="Processing", leave=False):
-        prompt = prompt_template.format(tweet=tweet)
-        result, usage = get_response(prompt, return_usage=True)
-        results.append(result)
-        
+    known_airlines = learn_from_training() if structured else None
+    settings = get_tuning()
+    concurrency = concurrency or settings['concurrency']
+    packing = 1 if structured else (packing or settings['packing'])
+    groups = [tweets[start:start + packing] for start in range(0, len(tweets), packing)]
+    progress = Progress("Processing", len(tweets))
+
+    def run_group(group):
+        group_start = time.perf_counter()
+        if structured:
+            result, usages = get_structured_response(group[0], method, known_airlines)
+            group_results = [result]
+        elif len(group) == 1:
+            group_results, usages = _extract_single(prompt_template, group[0])
+        else:
+            group_results, usages = _extract_packed(prompt_template, group)
+        progress.advance(len(group))
+        return group_results, usages, time.perf_counter() - group_start
+
+    if concurrency > 1 and len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # map() keeps results in tweet order
+            outcomes = list(executor.map(run_group, groups))
+    else:
+        outcomes = map(run_group, groups)
+
+    for group_results, usages, elapsed in outcomes:
+        results.extend(group_results)
+
         if track_metrics:
-            total_tokens += usage.total_tokens
-            cost = (usage.prompt_tokens * 0.0015 + usage.completion_tokens * 0.002) / 1000
-            costs.append(cost)
-    
+            total_tokens += sum(usage.total_tokens for usage in usages)
+            input_tokens += sum(usage.prompt_tokens for usage in usages)
+            cached_input_tokens += sum(get_cached_tokens(usage) for usage in usages)
+            # A packed request's cost is shared by its tweets
+            group_cost = sum(get_cost(usage) for usage in usages)
+            costs.extend([group_cost / len(group_results)] * len(group_results))
+            latencies.extend([elapsed / len(group_results)] * len(group_results))
+    progress.close()
+
     if track_metrics:
         metrics = ExtractionMetrics(
-            method_name=method.capitalize(),
+            method_name=method.capitalize() + (" (JSON)" if structured else ""),
             total_tokens=total_tokens,
             total_time=time.time() - start_time,
             total_tweets=len(tweets),
             exact_matches=0,  # Updated by main process
             similarity_scores=[],  # Updated by main process
-            costs=costs
+            costs=costs,
+            latencies=latencies,
+            input_tokens=input_tokens,
+            cached_input_tokens=cached_input_tokens
         )
         return results, metrics
-    
-    return results[0] if len(tweets) == 1 else results
\ No newline at end of file
+
+    return results[0] if len(tweets) == 1 else results
@@ -1,30 +1,134 @@
-PROMPTS = {
-    "zero-shot": """What airline is mentioned in this tweet? Only respond with the official airline name, not an abbreviation or variation on the name. If there is no airline name, return "No airline found".
+from dataclasses import dataclass
+from functools import cached_property, lru_cache
+import logging
+import re
+import tiktoken
+from config import MODEL
+
+FEW_SHOT_EXAMPLES = [
+    ("@AmericanAir your service is terrible!", "American Airlines"),
+    ("@United to LAX then @SouthwestAir to Vegas", "United Airlines, Southwest Airlines"),
+    ("@USAirways and @JetBlue both lost my bags today", "US Airways, JetBlue Airways"),
+    ("@VirginAmerica best airline ever", "Virgin America"),
+]
+
+def _format_examples(examples):
+    return "\n\n".join(f"Tweet: '{tweet}'\nAirlines: {airlines}" for tweet, airlines in examples)
+
+# Static instructions and examples live in the system message so every
+# request shares the same prefix and provider-side prompt caching applies.
+# Only the user message changes per tweet.
+TEMPLATES = {
+    "zero-shot": {
+        "system": """What airline is mentioned in this tweet? Only respond with the official airline name, not an abbreviation or variation on the name. If there is no airline name, return "No airline found".""",
+        "user": "Tweet: '{tweet}'"
+    },
+    "one-shot": {
+        "system": f"""Extract the official airline name from the tweet. If there is no airline name, return "No airline found". Use the example format below:
+
+{_format_examples(FEW_SHOT_EXAMPLES[:1])}""",
+        "user": "Tweet: '{tweet}'\nAirlines:"
+    },
+    "few-shot": {
+        "system": f"""Extract the official airline names from the tweet. If there is no airline name, return "No airline found". Use the examples format below:
 
-Tweet: '{tweet}'""",
+{_format_examples(FEW_SHOT_EXAMPLES)}""",
+        "user": "Tweet: '{tweet}'\nAirlines:"
+    },
+    "embeddings": {
+        "system": "Extract potential airline names from the tweet, one per line. Common airlines include: {known_airlines}",
+        "user": "Tweet: '{tweet}'\nAirlines (one per line):"
+    },
+    "fine-tuned": {
+        "system": "You are a helpful assistant that extracts airline names from tweets. Only respond with the official airline names, separated by commas if there are multiple airlines.",
+        "user": "Extract airlines from this tweet: {tweet}"
+    },
+    # A fine-tuned model has learned the task, so the compact format sends only the tweet
+    "fine-tuned-compact": {
+        "system": "",
+        "user": "{tweet}"
+    },
+}
 
-    "one-shot": """Extract the official airline name from the tweet. If there is no airline name, return "No airline found". Use the example format below:
+# Appended to the system prefix when several tweets share one request
+PACKING_INSTRUCTION = "Several numbered tweets follow. Answer every tweet on its own line, in order, as '<number>: <answer>'."
+_PACKED_LINE = re.compile(r'^\s*(\d+)\s*[:.)]\s*(.*?)\s*$')
 
-Tweet: '@AmericanAir your service is terrible!'
-Airlines: American Airlines
+def parse_packed_answer(text, count):
+    """Split a packed answer into per-tweet answers; missing ones are None."""
+    answers = [None] * count
+    for line in text.splitlines():
+        match = _PACKED_LINE.match(line)
+        if match and 1 <= int(match.group(1)) <= count and match.group(2):
+            answers[int(match.group(1)) - 1] = match.group(2)
+    return answers
 
-Tweet: '{tweet}'
-Airlines:""",
+@lru_cache(maxsize=None)
+def _get_encoding():
+    try:
+        return tiktoken.encoding_for_model(MODEL)
+    except Exception as e:
+        # The encoding is downloaded on first use; fall back to an estimate offline
+        logging.warning(f"Tokenizer unavailable, estimating token counts: {str(e)}")
+        return None
 
-    "few-shot": """Extract the official airline names from the tweet. If there is no airline name, return "No airline found". Use the examples format below:
+def count_tokens(text):
+    """Count tokens the way the chat model does."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoding.encode(text))
 
-Tweet: '@AmericanAir your service is terrible!'
-Airlines: American Airlines
+@dataclass(frozen=True)
+class PromptTemplate:
+    """A compiled prompt: a static system prefix plus a per-tweet user message."""
+    name: str
+    system: str
+    user: str
 
-Tweet: '@United to LAX then @SouthwestAir to Vegas'
-Airlines: United Airlines, Southwest Airlines
+    # Counted on first use and then cached on the template
+    @cached_property
+    def system_tokens(self) -> int:
+        return count_tokens(self.system)
 
-Tweet: '@USAirways and @JetBlue both lost my bags today'
-Airlines: US Airways, JetBlue Airways
+    @cached_property
+    def user_tokens(self) -> int:
+        return count_tokens(self.user.format(tweet=""))
 
-Tweet: '@VirginAmerica best airline ever'
-Airlines: Virgin America
+    @property
+    def static_tokens(self) -> int:
+        return self.system_tokens + self.user_tokens
 
-Tweet: '{tweet}'
-Airlines:"""
-}
\ No newline at end of file
+    def messages(self, tweet):
+        """Build chat messages for a single tweet."""
+        messages = [{"role": "user", "content": self.user.format(tweet=tweet)}]
+        if self.system:
+            messages.insert(0, {"role": "system", "content": self.system})
+        return messages
+
+    def packed_messages(self, tweets):
+        """Build chat messages asking about several numbered tweets at once."""
+        user = "\n\n".join(f"{i}. {self.user.format(tweet=tweet)}" for i, tweet in enumerate(tweets, 1))
+        return [
+            {"role": "system", "content": f"{self.system}\n\n{PACKING_INSTRUCTION}".strip()},
+            {"role": "user", "content": user}
+        ]
+
+@lru_cache(maxsize=None)
+def _compile(name, static_items):
+    template = TEMPLATES[name]
+    system = template["system"].format(**dict(static_items)) if static_items else template["system"]
+    return PromptTemplate(name=name, system=system, user=template["user"])
+
+def get_prompt(name, **static):
+    """
+    Return the compiled template for a method. Static values such as the
+    known-airline list are baked into the system prefix once and cached.
+    """
+    return _compile(name, tuple(sorted(static.items())))
+
+PROMPTS = {
+    name: get_prompt(name)
+    for name, template in TEMPLATES.items()
+    if "{" not in template["system"]
+}
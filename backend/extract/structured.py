@@ -0,0 +1,81 @@
+from utils.openai_client import get_chat_completion
+from utils.profiler import span
+from utils.canonicalize import NO_AIRLINE
+from config import MODEL
+from .prompts import PROMPTS, PromptTemplate
+from functools import lru_cache
+import json
+import logging
+
+# {"ids":[0,12,3]} is ~10 tokens; the retry gets more room in case the answer was cut off
+STRUCTURED_MAX_TOKENS = 24
+RETRY_MAX_TOKENS = 64
+TOOL_NAME = "report_airlines"
+
+def build_tool(known_airlines):
+    """Function-calling tool whose only argument is an array of airline IDs."""
+    return {
+        "type": "function",
+        "function": {
+            "name": TOOL_NAME,
+            "description": "Report the airlines mentioned in the tweet by ID. Use an empty list if there are none.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "ids": {
+                        "type": "array",
+                        "items": {"type": "integer", "enum": list(range(len(known_airlines)))}
+                    }
+                },
+                "required": ["ids"],
+                "additionalProperties": False
+            }
+        }
+    }
+
+@lru_cache(maxsize=None)
+def _structured_prompt(method, known_airlines):
+    template = PROMPTS[method]
+    id_list = "\n".join(f"{i}: {airline}" for i, airline in enumerate(known_airlines))
+    system = (f"{template.system}\n\nInstead of writing the names, call {TOOL_NAME} with the IDs "
+              f"of the airlines mentioned:\n{id_list}")
+    return PromptTemplate(name=f"{method}-structured", system=system, user=template.user)
+
+def parse_airline_ids(arguments, known_airlines):
+    """Map tool-call arguments to a comma-separated list of airline names."""
+    ids = json.loads(arguments)["ids"]
+    if not isinstance(ids, list) or not all(isinstance(i, int) and 0 <= i < len(known_airlines) for i in ids):
+        raise ValueError(f"Invalid airline IDs: {ids}")
+    names = sorted({known_airlines[i] for i in ids})
+    return ", ".join(names) if names else NO_AIRLINE
+
+def get_structured_response(tweet, method, known_airlines, model=MODEL):
+    """
+    Extract airlines as a compact array of IDs via a forced tool call.
+    A failed parse is retried once with a larger token limit; if that fails
+    too the result is None, so the tweet is scored as a failure.
+    Returns the result and the usage of every request made.
+    """
+    known_airlines = tuple(known_airlines)
+    messages = _structured_prompt(method, known_airlines).messages(tweet)
+    tool = build_tool(known_airlines)
+
+    usages = []
+    for max_tokens in (STRUCTURED_MAX_TOKENS, RETRY_MAX_TOKENS):
+        response = get_chat_completion(
+            messages,
+            model=model,
+            max_tokens=max_tokens,
+            tools=[tool],
+            tool_choice={"type": "function", "function": {"name": TOOL_NAME}}
+        )
+        usages.append(response.usage)
+
+        with span("parse_response"):
+            try:
+                tool_calls = response.choices[0].message.tool_calls
+                return parse_airline_ids(tool_calls[0].function.arguments, known_airlines), usages
+            except (TypeError, IndexError, KeyError, ValueError) as e:
+                logging.warning(f"Structured output parse failed ({e}), max_tokens={max_tokens}")
+
+    return None, usages
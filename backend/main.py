@@ -3,33 +3,43 @@
 import argparse
 import logging
 import traceback
-from pathlib import Path
 import pandas as pd
-from tqdm import tqdm
+from pathlib import Path
 from config import OUTPUT_DIR, LOG_DIR, DATA_PATH
 from utils.data_loader import load_dataset, save_results, save_comparison_metrics
-from utils.openai_client import verify_connection
+from utils.openai_client import client, verify_connection, enable_hedging, enable_cassette
 from extract.zero_shot import extract_airlines_zero_shot
 from extract.one_shot import extract_airlines_one_shot
 from extract.few_shot import extract_airlines_few_shot
 from extract.embeddings import extract_airlines_embeddings
 from extract.fine_tuned import (
     extract_airlines_fine_tuned, 
-    prepare_training_data,
-    create_fine_tuned_model,
     train_new_model
 )
 from extract.prompt_based import extract_airlines_prompt
-import re
+from extract.cascade import extract_airlines_cascade, tune_thresholds
+from extract.local_ml import extract_airlines_local_ml, train_local_model
+from extract.normalize import normalize_tweets, enable_normalization
 from utils.string_matcher import match_airline_name
-import numpy as np
+from utils.canonicalize import canonicalize, canonicalize_column
 import sys
 from utils.metrics_tracker import ExtractionMetrics
-import time
+from utils.results_store import new_run_id
+from utils.sharding import parse_shard, select_shard, write_shard, merge_shards, launch_local_shards
+import atexit
+from utils.profiler import span, enable_profiling, write_trace, format_summary
+from utils.sequential_eval import run_sequential_comparison
+from utils.streaming import run_stream
+from utils.log_pipeline import setup_logging
+from utils.job_graph import load_job_graph, plan_jobs, run_job_graph
+from utils.eval_manifest import reuse_evaluation, record_evaluation
+from utils.tuning import get_tuning, load_tuning_profile
+from utils.autotune import autotune
+from utils.label_index import get_label_index, parse_slice, select_slice, stratified_sample, slice_stats
 
 # Add after imports
-CLI_METHODS = ["zero-shot", "one-shot", "few-shot", "embeddings", "fine-tuned", "compare-all"]
-EXTRACTION_METHODS = ["zero-shot", "one-shot", "few-shot", "embeddings", "fine-tuned"]
+CLI_METHODS = ["zero-shot", "one-shot", "few-shot", "embeddings", "fine-tuned", "cascade", "local-ml", "compare-all"]
+EXTRACTION_METHODS = ["zero-shot", "one-shot", "few-shot", "embeddings", "fine-tuned", "cascade", "local-ml"]
 
 # ANSI color codes
 GREEN = "\033[32m"
@@ -38,31 +48,10 @@ CYAN = "\033[36m"
 RED = "\033[31m"
 RESET = "\033[0m"
 
-# Create formatters
-file_formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-console_formatter = logging.Formatter('%(levelname)s - %(message)s')
-
-# Set up root logger
+# Log records go through a queue to a background writer: JSON lines to the
+# log file, warnings and progress to the console
+setup_logging(LOG_DIR / 'extraction.log', console_level=logging.WARNING)
 logger = logging.getLogger()
-logger.setLevel(logging.INFO)
-
-# Create and configure file handler
-file_handler = logging.FileHandler(LOG_DIR / 'extraction.log')
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(file_formatter)
-
-# Create and configure console handler
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.WARNING)  # Only WARNING and above for console
-console_handler.setFormatter(console_formatter)
-
-# Remove any existing handlers
-for handler in logger.handlers[:]:
-    logger.removeHandler(handler)
-
-# Add both handlers to the logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
 
 def extract_airlines(tweet, method, model_id=None):
     """Select extraction method."""
@@ -79,144 +68,134 @@ def extract_airlines(tweet, method, model_id=None):
             if not model_id:
                 raise ValueError("Fine-tuned model ID required")
             return extract_airlines_fine_tuned(tweet, model_id)
+        elif method == "cascade":
+            return extract_airlines_cascade(tweet, model_id)
+        elif method == "local-ml":
+            return extract_airlines_local_ml(tweet)
         else:
             raise ValueError(f"Invalid method: {method}")
     except Exception as e:
         logging.error(f"Error processing tweet: {str(e)}")
         return None
 
-def clean_airline_name(airline_text):
-    """Clean airline name by removing numbers, brackets, quotes, and extra whitespace."""
-    if not airline_text:
-        return ""
-    # Remove numbered list format (e.g., "1. ", "2. ")
-    cleaned = re.sub(r'^\d+\.\s*', '', airline_text)
-    # Remove array formatting
-    cleaned = cleaned.strip('[]\'\" ')
-    # Handle common variations
-    replacements = {
-        'USAirways': 'US Airways',
-        'SouthwestAir': 'Southwest Airlines',
-        'AmericanAir': 'American Airlines'
-    }
-    for old, new in replacements.items():
-        cleaned = cleaned.replace(old, new)
-    return cleaned.strip()
+def extract_with_method(tweets, method, model_id=None, structured=False, normalize=True):
+    """Normalize tweets, run a single extraction method and return its results and metrics."""
+    normalization = {}
+    if normalize:
+        with span("normalize"):
+            tweets, normalization = normalize_tweets(tweets)
+    
+    with span("extract", method=method):
+        if method in ["zero-shot", "one-shot", "few-shot"]:
+            results, metrics = extract_airlines_prompt(tweets, method, track_metrics=True, structured=structured)
+        elif method == "embeddings":
+            results, metrics = extract_airlines_embeddings(tweets, track_metrics=True)
+        elif method == "fine-tuned":
+            results, metrics = extract_airlines_fine_tuned(tweets, model_id=model_id, track_metrics=True)
+        elif method == "cascade":
+            results, metrics = extract_airlines_cascade(tweets, model_id=model_id, track_metrics=True)
+        elif method == "local-ml":
+            results, metrics = extract_airlines_local_ml(tweets, track_metrics=True)
+        else:
+            raise ValueError(f"Invalid method: {method}")
+    
+    if normalization:
+        metrics.raw_tweet_tokens = normalization['tokens_before']
+        metrics.tweet_tokens_saved = normalization['tokens_before'] - normalization['tokens_after']
+    return results, metrics
+
+def check_normalization(tweets, results, data, method, model_id=None, structured=False, sample_size=50):
+    """
+    Re-run up to sample_size tweets that normalization altered on their raw
+    text and compare exact-match accuracy of both versions.
+    """
+    normalized, _ = normalize_tweets(tweets)
+    changed = [i for i, (raw, new) in enumerate(zip(tweets, normalized)) if raw != new][:sample_size]
+    if not changed:
+        print("\n📏 Normalization check: no tweets were altered")
+        return
+    
+    raw_results, _ = extract_with_method([tweets[i] for i in changed], method, model_id,
+                                         structured=structured, normalize=False)
+    expected = data['airlines'].iloc[changed]
+    raw_correct = sum(match_airline_name(result, label)[0]
+                      for result, label in zip(canonicalize_column(raw_results), expected))
+    normalized_correct = sum(match_airline_name(canonicalize(results[i]), label)[0]
+                             for i, label in zip(changed, expected))
+    print(f"\n📏 Normalization check on {len(changed)} altered tweets: "
+          f"raw {raw_correct / len(changed) * 100:.1f}% vs normalized {normalized_correct / len(changed) * 100:.1f}% exact matches")
+    logging.info(f"Normalization check ({method}): raw {raw_correct}/{len(changed)}, "
+                 f"normalized {normalized_correct}/{len(changed)}")
 
-def run_extraction(tweets, method, model_id=None):
-    """Run extraction with metrics tracking."""
-    print(f"\nRunning {method} extraction...")
+def run_extraction(tweets, method, model_id=None, run_id=None, data=None, save=True, structured=False,
+                   normalization_check=0, label_index=None, dataset=DATA_PATH):
+    """
+    Run extraction with metrics tracking. With the dataset's label_index,
+    accuracy, latency and cost are also broken down per airline and tweet length.
+    dataset is the source file recorded with saved results.
+    """
+    logging.info(f"Running {method} extraction on {len(tweets)} tweets")
     
     # Get extraction function
-    if method in ["zero-shot", "one-shot", "few-shot"]:
-        results, metrics = extract_airlines_prompt(tweets, method, track_metrics=True)
-    elif method == "embeddings":
-        results, metrics = extract_airlines_embeddings(tweets, track_metrics=True)
-    elif method == "fine-tuned":
-        results, metrics = extract_airlines_fine_tuned(tweets, model_id=model_id, track_metrics=True)
-    else:
-        raise ValueError(f"Invalid method: {method}")
+    results, metrics = extract_with_method(tweets, method, model_id, structured=structured)
     
     # Load original data for comparison
-    data = load_dataset()  # This now returns cleaned airlines data
+    if data is None:
+        data = load_dataset(dataset)  # This now returns cleaned airlines data
     
     # Update accuracy metrics
-    exact_matches = 0
+    exact_flags = []
     similarity_scores = []
     
-    for result, expected in zip(results, data['airlines']):
-        is_exact, similarity = match_airline_name(result, expected)
-        if is_exact:
-            exact_matches += 1
-        similarity_scores.append(similarity)
+    with span("score"):
+        for result, expected in zip(canonicalize_column(results), data['airlines']):
+            is_exact, similarity = match_airline_name(result, expected)
+            exact_flags.append(is_exact)
+            similarity_scores.append(similarity)
     
-    metrics.exact_matches = exact_matches
+    metrics.exact_matches = sum(exact_flags)
     metrics.similarity_scores = similarity_scores
+    if label_index is not None:
+        metrics.slice_stats = slice_stats(label_index, data.index[:len(exact_flags)], exact_flags,
+                                          similarity_scores, metrics.costs, metrics.latencies)
+    
+    if normalization_check:
+        check_normalization(tweets, results, data, method, model_id, structured=structured,
+                            sample_size=normalization_check)
     
     # Save results
-    save_results(results, method)
+    if save:
+        save_results(results, method, data=data, run_id=run_id, dataset=dataset)
     
     return results, metrics
 
-def run_comparison(methods, dataset, model_id=None):
-    """Run multiple methods and compare their performance."""
-    results = {}
-    data = load_dataset(dataset)
-    total = len(data)
-    
-    print("\n🔍 Evaluating Extraction Methods")
-    print("=" * 50)
-    
-    # Create comparison files
-    comparison_file = OUTPUT_DIR / "comparison_results.csv"
-    summary_file = OUTPUT_DIR / "comparison_summary.csv"
-    comparison_data = []
-    summary_data = []
-    
-    for method in methods:
-        correct = 0
-        similarity_scores = []
-        method_results = []
-        total_tokens = 0
-        total_cost = 0
-        start_time = time.time()
-        
-        pbar = tqdm(data.iterrows(), 
-                   total=total,
-                   desc=f"Testing {method:<12}",
-                   colour='green',
-                   leave=True)
-        
-        for _, row in pbar:
-            tweet = row['tweet']
-            expected = row['airlines'].strip('[]\'\"')
-            extracted, metrics = run_extraction([tweet], method, model_id if method == "fine-tuned" else None)
-            
-            total_tokens += metrics.total_tokens
-            total_cost += metrics.costs[0]
-            
-            is_exact, similarity = match_airline_name(extracted[0], expected)
-            similarity_scores.append(similarity)
-            
-            if is_exact:
-                correct += 1
-            
-            method_results.append({
-                'method': method,
-                'tweet': tweet,
-                'expected': expected,
-                'extracted': extracted[0],
-                'exact_match': is_exact,
-                'similarity': similarity
-            })
-        
-        # Calculate metrics
-        accuracy = (correct/total) * 100
-        avg_similarity = np.mean(similarity_scores) * 100
-        total_time = time.time() - start_time
-        
-        # Store summary data
-        summary_data.append({
-            'method': method,
-            'accuracy': accuracy,
-            'similarity': avg_similarity,
-            'tokens': total_tokens,
-            'cost': total_cost,
-            'time': total_time
-        })
-        
-        comparison_data.extend(method_results)
-    
-    # Save detailed comparison results
-    pd.DataFrame(comparison_data).to_csv(comparison_file, index=False)
-    
-    # Save summary results
-    pd.DataFrame(summary_data).to_csv(summary_file, index=False)
-    
-    return results
+def run_job(job, run_id, structured=False):
+    """Run one job of a run matrix and store its results."""
+    data = load_dataset(job.dataset)
+    results, metrics = run_extraction(data['tweet'].tolist(), job.method, job.model_id,
+                                      data=data, save=False, structured=structured,
+                                      label_index=get_label_index(job.dataset))
+    metrics.method_name = f"{job.name} ({job.dataset.name})"
+    save_results(results, job.label, data=data, run_id=run_id, dataset=job.dataset)
+    return metrics
+
+def run_jobs(path, run_id=None, structured=False):
+    """Run a dataset × method matrix from a job file in this process."""
+    graph = load_job_graph(path)
+    run_id = graph.get('run_id') or run_id or new_run_id()
+    if graph.get('response_cache', True):
+        client.enable_cache()
+    jobs = plan_jobs(graph, EXTRACTION_METHODS, lambda dataset: len(load_dataset(dataset)))
+    return run_job_graph(jobs, lambda job: run_job(job, run_id, structured=structured),
+                         parallel=graph.get('parallel', 1))
 
 def test_single_tweet(tweet, method, model_id=None):
     """Test extraction on a single tweet."""
+    normalized = normalize_tweets([tweet])[0][0]
+    if normalized != tweet:
+        print(f"\n{CYAN}Normalized tweet: {RESET}{normalized}")
+        tweet = normalized
+    
     if method == "compare-all":
         print("\n🔍 Testing all methods...")
         results = []
@@ -239,6 +218,14 @@ def test_single_tweet(tweet, method, model_id=None):
                     except FileNotFoundError:
                         method_results.append((method, "Skipping (training data not found)", 0, 0, 0))
                         continue
+                elif method == "cascade":
+                    result, metrics = extract_airlines_cascade([tweet], model_id=model_id, track_metrics=True)
+                elif method == "local-ml":
+                    try:
+                        result, metrics = extract_airlines_local_ml([tweet], track_metrics=True)
+                    except FileNotFoundError:
+                        method_results.append((method, "Skipping (training data not found)", 0, 0, 0))
+                        continue
                 else:
                     if method == "zero-shot":
                         result, metrics = extract_airlines_zero_shot([tweet], track_metrics=True)
@@ -284,6 +271,10 @@ def test_single_tweet(tweet, method, model_id=None):
             result, metrics = extract_airlines_embeddings([tweet], track_metrics=True)
         elif method == "fine-tuned":
             result, metrics = extract_airlines_fine_tuned([tweet], model_id=model_id, track_metrics=True)
+        elif method == "cascade":
+            result, metrics = extract_airlines_cascade([tweet], model_id=model_id, track_metrics=True)
+        elif method == "local-ml":
+            result, metrics = extract_airlines_local_ml([tweet], track_metrics=True)
         else:
             raise ValueError(f"Invalid method: {method}")
         
@@ -292,6 +283,37 @@ def test_single_tweet(tweet, method, model_id=None):
         print(f"Tokens Used: {metrics.total_tokens}")
         print(f"Cost: ${metrics.costs[0]:.4f}")
 
+def evaluate_method(method, data, data_path, run_id, args, shard=None):
+    """
+    Evaluate one method on the dataset, reusing the stored evaluation when
+    none of its inputs changed since it was recorded.
+    """
+    structured = args.output_format == 'json'
+    # Shards, slices and samples only cover part of the dataset, so they are never reused or recorded
+    incremental = not shard and not args.slice and not args.sample and not args.no_reuse
+    if incremental:
+        metrics = reuse_evaluation(method, data_path, run_id, args.model_id, structured)
+        if metrics is not None:
+            return metrics
+    
+    print(f"\nRunning {method} extraction...")
+    results, metrics = run_extraction(data['tweet'].tolist(), method, args.model_id,
+                                      run_id=run_id, data=data, save=not shard,
+                                      structured=structured,
+                                      normalization_check=args.normalization_check,
+                                      label_index=get_label_index(data_path), dataset=data_path)
+    if shard:
+        write_shard(run_id, *shard, method, results, metrics, data)
+    elif incremental:
+        record_evaluation(method, data_path, run_id, metrics, args.model_id, structured)
+    return metrics
+
+def finish_profiling():
+    """Write the profiling trace and print per-stage timings."""
+    trace_path = write_trace()
+    print(f"\n⏱️  Stage Timings\n{format_summary()}")
+    print(f"📝 Trace: {trace_path}")
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--method', default='zero-shot', 
@@ -299,8 +321,89 @@ def main():
     parser.add_argument('--dataset', type=str, help='Path to dataset CSV file')
     parser.add_argument('--model-id', type=str, help='Fine-tuned model ID', default=None)
     parser.add_argument('--train-model', action='store_true', help='Train a new fine-tuned model')
+    parser.add_argument('--compact-prompt', action='store_true',
+                        help='Train the fine-tuned model on bare tweets with terse answers to cut per-request tokens')
+    parser.add_argument('--full-retrain', action='store_true',
+                        help='Train from the base model on all examples instead of continuing the latest model on new ones')
+    parser.add_argument('--train-local', action='store_true', help='Retrain the local-ml classifier')
     parser.add_argument('--test-tweet', type=str, help='Single tweet to test extraction on')
+    parser.add_argument('--tune-cascade', action='store_true',
+                        help='Tune cascade thresholds against the labelled dataset')
+    parser.add_argument('--target-accuracy', type=float, default=90.0,
+                        help='Accuracy target (%%) for cascade threshold tuning')
+    parser.add_argument('--shard', type=str, help='Only process shard i of N (e.g. 0/4)')
+    parser.add_argument('--workers', type=int, help='Run N local shard processes and merge their outputs')
+    parser.add_argument('--run-id', type=str, help='Run ID shared by all shards of a job')
+    parser.add_argument('--merge', type=str, metavar='RUN_ID', help='Merge shard outputs of a run')
+    parser.add_argument('--profile', nargs='?', const='spans', choices=['spans', 'cprofile', 'sampling'],
+                        help='Write a per-stage timing trace to the logs directory')
+    parser.add_argument('--output-format', choices=['text', 'json'], default='text',
+                        help='json: prompt-based methods answer with known-airline IDs via a tool call')
+    parser.add_argument('--sequential', action='store_true',
+                        help='compare-all: stop early once the method ranking is statistically settled')
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help='Confidence level for --sequential')
+    parser.add_argument('--stream', type=str, metavar='SOURCE',
+                        help="Extract from NDJSON tweets read from a file, named pipe or '-' for stdin")
+    parser.add_argument('--follow', action='store_true', help='Keep reading a growing --stream file')
+    parser.add_argument('--stream-output', type=str, help='NDJSON file results are appended to')
+    parser.add_argument('--max-in-flight', type=int, default=32,
+                        help='Tweets buffered before --stream input is blocked')
+    parser.add_argument('--concurrency', type=int,
+                        help='Concurrent --stream workers (default: tuning profile, at least 4)')
+    parser.add_argument('--no-normalize', action='store_true',
+                        help='Send tweets to the extractors without pre-normalization')
+    parser.add_argument('--normalization-check', type=int, default=0, metavar='N',
+                        help='Re-run N normalized tweets on their raw text and compare accuracy')
+    parser.add_argument('--jobs', type=str, metavar='FILE',
+                        help='Run a dataset × method matrix from a TOML/YAML job file')
+    parser.add_argument('--no-reuse', action='store_true',
+                        help='Recompute every method even if its inputs are unchanged since the last run')
+    parser.add_argument('--autotune', action='store_true',
+                        help='Probe the API to pick concurrency, packing and embedding batch size')
+    parser.add_argument('--autotune-sample', type=int, default=40,
+                        help='Labelled tweets used per --autotune probe')
+    parser.add_argument('--slice', type=str, metavar='KIND=VALUE',
+                        help="Only evaluate one slice of the dataset, e.g. 'airline=US Airways' or 'length=long'")
+    parser.add_argument('--sample', type=int, metavar='N',
+                        help='Only evaluate a sample of about N rows stratified by airline')
+    parser.add_argument('--breakdown', choices=['airline', 'length'], nargs='?', const='airline',
+                        help='Print accuracy, latency and cost per airline (or tweet length) after a run')
+    parser.add_argument('--hedge', action='store_true',
+                        help='Send a duplicate of API calls slower than the recent p95 and use the first reply')
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument('--record', type=str, metavar='CASSETTE',
+                                help='Record chat and embedding traffic with its timing to a .jsonl.gz cassette')
+    cassette_group.add_argument('--replay', type=str, metavar='CASSETTE',
+                                help='Serve chat and embedding calls from a recorded cassette, without the network')
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help='Divide recorded latencies by this for --replay (0: no delay)')
     args = parser.parse_args()
+    # A replayed cassette answers every request, so only live runs need a key
+    if not args.replay:
+        client.require_keys()
+    
+    if args.profile:
+        enable_profiling(cprofile=args.profile == 'cprofile', sampling=args.profile == 'sampling')
+        atexit.register(finish_profiling)
+    
+    # Throughput settings chosen by a previous --autotune
+    load_tuning_profile()
+    
+    if args.no_normalize:
+        enable_normalization(False)
+    
+    if len(client.endpoints) > 1:
+        atexit.register(lambda: print(f"\n🔀 Endpoints\n{client.format_stats()}"))
+    
+    if args.record or args.replay:
+        cassette = enable_cassette(args.record or args.replay, 'record' if args.record else 'replay',
+                                   args.replay_speed)
+        atexit.register(lambda: (cassette.close(), print(f"\n📼 {cassette.format_stats()}")))
+    
+    if args.hedge:
+        hedger = enable_hedging()
+        atexit.register(lambda: print(f"\n⚡ Hedging\n{hedger.format_stats()}"))
     
     # Handle single tweet test
     if args.test_tweet:
@@ -310,52 +413,147 @@ def main():
     # Handle model training request
     if args.train_model:
         try:
-            model_id = train_new_model()
+            model_id = train_new_model(prompt_format='compact' if args.compact_prompt else 'standard',
+                                       incremental=not args.full_retrain)
             print(model_id)  # Print just the model ID for shell script to capture
             return
         except Exception as e:
             logger.error(f"Failed to train model: {str(e)}")
             sys.exit(1)
     
+    if args.train_local:
+        train_local_model()
+        print("✅ Local classifier trained")
+        return
+    
     # Create output directory if it doesn't exist
     OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
     
-    # Verify OpenAI connection
-    if not verify_connection():
+    # Handle shard merge request
+    if args.merge:
+        all_metrics, _ = merge_shards(args.merge, dataset=args.dataset)
+        for method, metrics in all_metrics.items():
+            print(f"\n{metrics.format_table()}")
+        return
+    
+    # Verify OpenAI connection (local-ml and cassette replay make no API calls)
+    if args.method != 'local-ml' and not args.replay and not verify_connection():
+        if args.shard:
+            sys.exit(1)
+        return
+    
+    # Run matrices share one process, dataset cache and endpoint pool
+    if args.jobs:
+        run_jobs(args.jobs, run_id=args.run_id, structured=args.output_format == 'json')
         return
     
     # If fine-tuned method is selected and no model ID, create one first
     if args.method == 'fine-tuned' and not args.model_id:
         logger.info("Creating new fine-tuned model...")
         try:
-            training_file = prepare_training_data()
-            args.model_id = create_fine_tuned_model(training_file)
+            args.model_id = train_new_model(prompt_format='compact' if args.compact_prompt else 'standard',
+                                            incremental=not args.full_retrain)
             logger.info(f"Successfully created fine-tuned model: {args.model_id}")
         except Exception as e:
             logger.error(f"Failed to create fine-tuned model: {str(e)}")
             return
         
+    # Streaming mode doesn't use a dataset
+    if args.stream:
+        if args.method == 'compare-all':
+            raise ValueError("compare-all is not supported in streaming mode")
+        run_stream(
+            args.stream,
+            lambda tweets: extract_with_method(tweets, args.method, args.model_id,
+                                               structured=args.output_format == 'json'),
+            output_path=args.stream_output,
+            max_in_flight=args.max_in_flight,
+            workers=args.concurrency or max(4, get_tuning()['concurrency']),
+            follow=args.follow
+        )
+        return
+    
     # Load dataset
     data_path = Path(args.dataset) if args.dataset else DATA_PATH
     logger.info(f"Loading dataset from {str(data_path)}")
     data = load_dataset(data_path)
+    run_id = args.run_id or new_run_id()
+    
+    # Fan out to local shard processes, then merge
+    if args.workers and not args.shard:
+        argv = [arg for arg in sys.argv[1:] if not arg.startswith('--workers=')]
+        if '--workers' in argv:
+            index = argv.index('--workers')
+            del argv[index:index + 2]
+        if args.model_id and '--model-id' not in argv:
+            argv += ['--model-id', args.model_id]
+        all_metrics, _ = launch_local_shards(argv, args.workers, run_id, dataset=data_path)
+        for method, metrics in all_metrics.items():
+            print(f"\n{metrics.format_table()}")
+        return
+    
+    shard = parse_shard(args.shard) if args.shard else None
+    if shard:
+        data = select_shard(data, *shard)
+        logger.info(f"Processing shard {args.shard} with {len(data)} rows")
+    
+    if args.slice:
+        data = select_slice(data, get_label_index(data_path), parse_slice(args.slice))
+        print(f"📂 Slice {args.slice}: {len(data)} rows")
+    if args.sample:
+        data = stratified_sample(data, get_label_index(data_path), args.sample)
+        print(f"🎲 Stratified sample: {len(data)} rows")
     
-    if args.method == 'compare-all':
+    if args.autotune:
+        autotune(data, sample_size=args.autotune_sample)
+        return
+    
+    if args.tune_cascade:
+        tune_thresholds(data, target_accuracy=args.target_accuracy, model_id=args.model_id)
+        return
+    
+    if args.method == 'compare-all' and args.sequential:
+        methods = [method for method in EXTRACTION_METHODS if method != "fine-tuned" or args.model_id]
+        batches = {}
+        
+        def run_batch(method, batch):
+            results, metrics = run_extraction(batch['tweet'].tolist(), method, args.model_id,
+                                              data=batch, save=False,
+                                              structured=args.output_format == 'json',
+                                              label_index=get_label_index(data_path))
+            batches.setdefault(method, []).append((list(results), batch))
+            return results, metrics
+        
+        all_metrics, _ = run_sequential_comparison(data, methods, run_batch, confidence=args.confidence)
+        # One results part per method rather than one per batch
+        for method, parts in batches.items():
+            save_results([result for results, _ in parts for result in results], method,
+                         data=pd.concat([batch for _, batch in parts]), run_id=run_id, dataset=data_path)
+        save_comparison_metrics(all_metrics)
+    elif args.method == 'compare-all':
         all_metrics = {}
         for method in EXTRACTION_METHODS:  # Use EXTRACTION_METHODS instead
-            results, metrics = run_extraction(data['tweet'].tolist(), method, args.model_id)
+            metrics = evaluate_method(method, data, data_path, run_id, args, shard)
             all_metrics[method] = metrics
         
+        # Shard summaries are combined by --merge
+        if shard:
+            return
+        
         # Print all metrics after completion
         for method, metrics in all_metrics.items():
             print(f"\n{metrics.format_table()}")
+            if args.breakdown:
+                print(metrics.format_slices(args.breakdown))
             
         # Save combined metrics
         save_comparison_metrics(all_metrics)
     else:
-        results, metrics = run_extraction(data['tweet'].tolist(), args.method, args.model_id)
+        metrics = evaluate_method(args.method, data, data_path, run_id, args, shard)
         # Print metrics only after completion
         print(f"\n{metrics.format_table()}")
+        if args.breakdown:
+            print(metrics.format_slices(args.breakdown))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from utils import endpoint_pool
+from utils.endpoint_pool import EndpointPool
+
+COMPLETION = {
+    "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": "gpt-3.5-turbo",
+    "choices": [{"index": 0, "finish_reason": "stop",
+                 "message": {"role": "assistant", "content": "United"}}],
+    "usage": {"prompt_tokens": 5, "completion_tokens": 1, "total_tokens": 6}
+}
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers chat completions with whatever the server's script says next."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers['Content-Length']))
+        server = self.server
+        server.hits += 1
+        status, headers = server.responses.pop(0) if server.responses else (200, {})
+        body = COMPLETION if status == 200 else {"error": {"message": "stub error"}}
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode())
+
+@pytest.fixture
+def stubs():
+    servers = []
+    for _ in range(2):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+        server.hits = 0
+        server.responses = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+    yield servers
+    for server in servers:
+        server.shutdown()
+
+def make_pool(servers):
+    return EndpointPool([
+        {"name": f"stub-{i}", "api_key": "test", "base_url": f"http://127.0.0.1:{server.server_port}/v1"}
+        for i, server in enumerate(servers)
+    ])
+
+def chat(pool):
+    return pool.chat.completions.create(model="gpt-3.5-turbo",
+                                        messages=[{"role": "user", "content": "hi"}])
+
+def test_fails_over_on_rate_limit(stubs):
+    pool = make_pool(stubs)
+    # Both are idle, so the first call goes to stub-0, is limited, and moves to stub-1
+    stubs[0].responses = [(429, {'retry-after': '30'})]
+    response = chat(pool)
+
+    assert response.choices[0].message.content == "United"
+    assert [server.hits for server in stubs] == [1, 1]
+    assert pool.endpoints[0].rate_limited == 1
+    assert pool.endpoints[0].cooldown_until - time.monotonic() > 25
+    # The limited endpoint is rested, so later calls avoid it
+    chat(pool)
+    assert [server.hits for server in stubs] == [1, 2]
+
+def test_cooldown_from_rate_limit_headers(stubs):
+    pool = make_pool(stubs)
+    stubs[0].responses = [(200, {'x-ratelimit-remaining-requests': '0',
+                                 'x-ratelimit-reset-requests': '6m0s'})]
+    chat(pool)
+    remaining = pool.endpoints[0].cooldown_until - time.monotonic()
+    assert 350 < remaining <= 360
+    chat(pool)
+    assert [server.hits for server in stubs] == [1, 1]
+
+def test_single_endpoint_backs_off_and_retries(stubs):
+    pool = make_pool(stubs[:1])
+    stubs[0].responses = [(429, {'retry-after': '0.2'}), (429, {'retry-after': '0.2'})]
+    start = time.monotonic()
+    response = chat(pool)
+
+    assert response.choices[0].message.content == "United"
+    assert stubs[0].hits == 3
+    assert time.monotonic() - start >= 0.4
+
+def test_failure_cooldown_doubles(stubs, monkeypatch):
+    monkeypatch.setattr(endpoint_pool, "FAILURE_COOLDOWN", 0.1)
+    pool = make_pool(stubs[:1])
+    stubs[0].responses = [(500, {}), (500, {})]
+    start = time.monotonic()
+    chat(pool)
+
+    assert stubs[0].hits == 3
+    assert time.monotonic() - start >= 0.3
+    assert pool.endpoints[0].streak == 0
+
+def test_missing_key_fails_only_when_a_request_is_sent(stubs):
+    pool = EndpointPool([{"name": "no-key", "api_key": None,
+                          "base_url": f"http://127.0.0.1:{stubs[0].server_port}/v1"}])
+    with pytest.raises(ValueError, match="No API key for endpoint no-key"):
+        chat(pool)
+    assert stubs[0].hits == 0
@@ -0,0 +1,32 @@
+import threading
+import time
+from utils.hedging import Hedger
+
+def test_queued_requests_are_not_hedged():
+    # More concurrent callers than hedge workers, each request well under the deadline
+    hedger = Hedger(initial_delay=0.15, min_samples=1000, budget=1.0, max_workers=2)
+
+    def call():
+        time.sleep(0.1)
+        return "ok"
+
+    threads = [threading.Thread(target=hedger.call, args=(call,)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert hedger.requests == 8
+    assert hedger.hedges_sent == 0
+
+def test_slow_request_is_hedged():
+    hedger = Hedger(initial_delay=0.05, min_samples=1000, budget=1.0, max_workers=4)
+    calls = iter([0.5, 0.0])
+
+    def call():
+        time.sleep(next(calls))
+        return "ok"
+
+    assert hedger.call(call) == "ok"
+    assert hedger.hedges_sent == 1
+    assert hedger.hedges_won == 1
@@ -0,0 +1,8 @@
+from extract.local_ml import extract_airlines_local_ml
+
+def test_empty_input_returns_empty_results():
+    results, metrics = extract_airlines_local_ml([])
+    assert list(results) == []
+    assert metrics.total_tweets == 0
+    assert metrics.total_cost == 0
+    assert len(metrics.latencies) == 0
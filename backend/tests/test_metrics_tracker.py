@@ -0,0 +1,36 @@
+import pickle
+import pytest
+from utils.metrics_tracker import ExtractionMetrics
+
+def make_metrics(costs, similarity_scores=()):
+    return ExtractionMetrics("test", 0, 1.0, len(costs), 0, list(similarity_scores), list(costs))
+
+def test_total_follows_appends_and_concatenation():
+    metrics = make_metrics([0.5, 0.25])
+    metrics.costs.append(0.25)
+    metrics.costs += make_metrics([1.0]).costs
+    metrics.costs += [2.0]
+    assert metrics.total_cost == pytest.approx(4.0)
+    assert metrics.avg_cost_per_tweet == pytest.approx(0.8)
+
+def test_total_follows_in_place_edits():
+    metrics = make_metrics([1.0, 0.5, 0.4])
+    metrics.costs[0] = 10.0
+    assert metrics.total_cost == pytest.approx(10.9)
+    metrics.costs[1:3] = make_metrics([0.1, 0.1]).costs
+    assert metrics.total_cost == pytest.approx(10.2)
+    metrics.costs.pop()
+    del metrics.costs[0]
+    metrics.costs.insert(0, 3.0)
+    metrics.costs.remove(0.1)
+    assert metrics.total_cost == pytest.approx(3.0)
+    metrics.costs.append(1.0)
+    assert metrics.total_cost == pytest.approx(4.0)
+
+def test_similarity_average_and_pickling():
+    metrics = make_metrics([0.1, 0.1], [100.0, 50.0])
+    metrics.similarity_scores[1] = 0.0
+    assert metrics.avg_similarity == pytest.approx(50.0)
+    restored = pickle.loads(pickle.dumps(metrics))
+    assert restored.total_cost == pytest.approx(0.2)
+    assert restored.to_dict()['costs'] == [0.1, 0.1]
@@ -0,0 +1,26 @@
+import pytest
+from extract import normalize
+from utils import canonicalize
+
+@pytest.fixture
+def seed_aliases_only(monkeypatch):
+    # As on a machine without training data
+    table = dict(canonicalize.SEED_ALIASES)
+    table[canonicalize.normalize_key(canonicalize.NO_AIRLINE)] = canonicalize.NO_AIRLINE
+    monkeypatch.setattr(canonicalize, "_alias_table", table)
+
+def test_airline_handle_after_mention_limit_is_kept(seed_aliases_only):
+    tweet = "@bob @alice @carol @dave thanks for nothing @JetBlue"
+    assert normalize._limit_mentions(tweet, 2) == "@bob @alice   thanks for nothing @JetBlue"
+
+def test_handle_variants_are_airlines(seed_aliases_only):
+    for handle in ("united", "JetBlue", "DeltaAssist", "SouthwestAir", "VirginAmerica", "AmericanAir"):
+        assert canonicalize.is_airline_handle(handle), handle
+    for handle in ("bob", "nytimes", "NoAirlineFound"):
+        assert not canonicalize.is_airline_handle(handle), handle
+
+def test_normalized_tweet_keeps_airline_handle(seed_aliases_only):
+    normalize.enable_normalization(True)
+    tweets, _ = normalize.normalize_tweets(["@a @b @c @d @e my bag is lost @united"])
+    assert "@united" in tweets[0]
+    assert "@c" not in tweets[0]
@@ -0,0 +1,44 @@
+from types import SimpleNamespace
+from openai.types import CompletionUsage
+from extract import structured
+from utils.canonicalize import NO_AIRLINE, canonicalize
+from utils.string_matcher import match_airline_name
+
+def tool_call_response(arguments):
+    call = SimpleNamespace(function=SimpleNamespace(name=structured.TOOL_NAME, arguments=arguments))
+    message = SimpleNamespace(content=None, tool_calls=[call])
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                           usage=CompletionUsage(prompt_tokens=50, completion_tokens=5, total_tokens=55))
+
+def test_unparseable_tool_calls_score_as_wrong(monkeypatch):
+    replies = iter([tool_call_response('{"ids": [0,'), tool_call_response('{"names": ["United"]}')])
+    monkeypatch.setattr(structured, "get_chat_completion", lambda messages, **kwargs: next(replies))
+
+    result, usages = structured.get_structured_response("just landed, great crew", "zero-shot",
+                                                        ["Delta Air Lines", "United Airlines"])
+
+    assert result is None
+    assert len(usages) == 2
+    assert match_airline_name(canonicalize(result), NO_AIRLINE) == (False, 0.0)
+
+def test_valid_tool_call_maps_ids_to_names(monkeypatch):
+    monkeypatch.setattr(structured, "get_chat_completion",
+                        lambda messages, **kwargs: tool_call_response('{"ids": [1]}'))
+
+    result, usages = structured.get_structured_response("@united lost my bag", "zero-shot",
+                                                        ["Delta Air Lines", "United Airlines"])
+
+    assert result == "United Airlines"
+    assert len(usages) == 1
+
+def test_failed_rows_are_missing_in_batch_results(monkeypatch):
+    from extract import prompt_based
+    monkeypatch.setattr(structured, "get_chat_completion",
+                        lambda messages, **kwargs: tool_call_response('not json'))
+    monkeypatch.setattr(prompt_based, "learn_from_training", lambda: ["United Airlines"])
+
+    results, metrics = prompt_based.extract_airlines_prompt(["nothing to see"], "zero-shot",
+                                                            structured=True, concurrency=1)
+
+    assert list(results) == [None]
+    assert metrics.total_tokens == 110
@@ -1,10 +1,22 @@
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.feature_extraction.text import TfidfVectorizer
 from utils.openai_client import get_response
+from utils.results_store import latest_run_id, load_manifest, query_results, summarize_results
 from config import OUTPUT_DIR
 
+MAX_CLUSTERS = 8
+EXAMPLES_PER_CLUSTER = 10
+MAX_CONCURRENT_ANALYSES = 4
+
 ANALYSIS_PROMPT = """
 Analyze these failed airline extractions and identify patterns in the errors.
+They were grouped together because they look alike ({cluster_size} similar failures in total).
 Focus on why the model might have made these mistakes and how to improve the prompt.
 
 Failed Examples:
@@ -16,9 +28,8 @@ Please provide:
 3. Specific examples of how these errors could be avoided
 """
 
-def format_examples(failures, max_examples=10):
+def format_examples(examples):
     """Format failure examples for the prompt."""
-    examples = failures.sample(min(len(failures), max_examples))
     formatted = []
     for _, row in examples.iterrows():
         formatted.append(
@@ -28,50 +39,154 @@ def format_examples(failures, max_examples=10):
         )
     return "\n".join(formatted)
 
-def analyze_method_failures(method):
+def failure_key(row):
+    """Stable hash identifying a failure across runs."""
+    text = f"{row['tweet']}\x1f{row['expected']}\x1f{row['extracted']}"
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def load_analysis_cache(cache_file):
+    """Load previously analyzed failures and their cluster summaries."""
+    if not cache_file.exists():
+        return {'seen': [], 'clusters': []}
+    with open(cache_file) as f:
+        cache = json.load(f)
+    # Clusters cached before member keys were kept can't be matched to current failures
+    if any('members' not in cluster for cluster in cache['clusters']):
+        return {'seen': [], 'clusters': []}
+    return cache
+
+def save_analysis_cache(cache_file, cache):
+    """Persist analyzed failures and their cluster summaries."""
+    with open(cache_file, 'w') as f:
+        json.dump(cache, f, indent=2)
+
+def cluster_failures(failures, max_clusters=MAX_CLUSTERS, examples_per_cluster=EXAMPLES_PER_CLUSTER):
+    """
+    Group failures with TF-IDF and mini-batch k-means.
+    Returns a list of (cluster_rows, representative_rows) tuples, where the
+    representatives are the rows closest to the cluster centroid.
+    """
+    if len(failures) <= examples_per_cluster:
+        return [(failures, failures)]
+    
+    text = (failures['tweet'].astype(str) + ' expected: ' + failures['expected'].astype(str)
+            + ' extracted: ' + failures['extracted'].astype(str))
+    features = TfidfVectorizer(analyzer='char_wb', ngram_range=(3, 5), min_df=1).fit_transform(text)
+    
+    n_clusters = min(max_clusters, max(1, len(failures) // examples_per_cluster))
+    kmeans = MiniBatchKMeans(n_clusters=n_clusters, random_state=0, n_init=3)
+    labels = kmeans.fit_predict(features)
+    distances = kmeans.transform(features)
+    
+    clusters = []
+    for label in range(n_clusters):
+        members = np.flatnonzero(labels == label)
+        if len(members) == 0:
+            continue
+        closest = members[np.argsort(distances[members, label])[:examples_per_cluster]]
+        clusters.append((failures.iloc[members], failures.iloc[closest]))
+    return clusters
+
+def analyze_method_failures(method, run_id=None):
     """Analyze failures for a specific method and suggest improvements."""
-    failures_file = OUTPUT_DIR / f"failures_{method}.csv"
-    if not failures_file.exists():
-        # Try reading from the results file instead
-        results_file = OUTPUT_DIR / f"results_{method}.csv"
-        if not results_file.exists():
-            print(f"No data found for {method}")
-            return
-            
-        # Read results and filter for failures
-        results = pd.read_csv(results_file)
-        failures = results[results['correct'] == False][['tweet', 'airlines', 'extracted']]
-        # Rename column to match expected format
-        failures = failures.rename(columns={'airlines': 'expected'})
-    else:
-        failures = pd.read_csv(failures_file)
+    run_id = run_id or latest_run_id(method)
+    if run_id is None:
+        print(f"No data found for {method}")
+        return
+    
+    # Only failed rows of the requested partition are read from disk
+    failures = query_results(
+        run_id=run_id,
+        method=method,
+        exact_match=False,
+        columns=['tweet', 'expected', 'extracted']
+    )
     
     if len(failures) == 0:
         print(f"No failures to analyze for {method}")
         return
     
-    print(f"\n🔍 Analyzing failures for {method}...")
-    examples = format_examples(failures)
-    prompt = ANALYSIS_PROMPT.format(examples=examples)
+    cache_file = OUTPUT_DIR / f"analysis_cache_{method}.json"
+    cache = load_analysis_cache(cache_file)
+    
+    # Only failures that were not part of an earlier analysis are clustered
+    failures = failures.assign(key=failures.apply(failure_key, axis=1))
+    new_failures = failures[~failures['key'].isin(cache['seen'])].drop_duplicates('key')
     
-    analysis = get_response(prompt)
+    if len(new_failures) > 0:
+        clusters = cluster_failures(new_failures)
+        print(f"\n🔍 Analyzing {len(new_failures)} new failures for {method} in {len(clusters)} clusters...")
+        
+        prompts = [
+            ANALYSIS_PROMPT.format(cluster_size=len(cluster), examples=format_examples(representatives))
+            for cluster, representatives in clusters
+        ]
+        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_ANALYSES) as executor:
+            analyses = list(executor.map(get_response, prompts))
+        
+        for (cluster, representatives), analysis in zip(clusters, analyses):
+            cache['clusters'].append({
+                'size': len(cluster),
+                'members': cluster['key'].tolist(),
+                'examples': representatives[['tweet', 'expected', 'extracted']].to_dict('records'),
+                'analysis': analysis
+            })
+        cache['seen'].extend(new_failures['key'].tolist())
+        save_analysis_cache(cache_file, cache)
+    else:
+        print(f"\n✅ No new failures for {method}, using cached analysis")
+    
+    # Only clusters with failures still present in this run, largest error modes first
+    current = set(failures['key'])
+    clusters = []
+    for cluster in cache['clusters']:
+        remaining = len(current.intersection(cluster['members']))
+        if remaining:
+            clusters.append(dict(cluster, size=remaining))
+    clusters.sort(key=lambda cluster: cluster['size'], reverse=True)
+    report = "\n\n".join(
+        f"Cluster {i} ({cluster['size']} failures)\n{'-' * 60}\n{cluster['analysis']}"
+        for i, cluster in enumerate(clusters, 1)
+    )
     
     print("\n📊 Analysis Results:")
     print("=" * 60)
-    print(analysis)
+    print(report)
     print("=" * 60)
     
     # Save analysis
     with open(OUTPUT_DIR / f"analysis_{method}.txt", "w") as f:
         f.write(f"Analysis for {method}\n")
         f.write("=" * 60 + "\n")
-        f.write(analysis)
+        f.write(report)
+
+def compare_methods(run_id=None):
+    """Print per-method accuracy for a run straight from the results store."""
+    run_id = run_id or latest_run_id()
+    summary = summarize_results(run_id)
+    if summary.empty:
+        print("No results found to compare")
+        return summary
+    
+    print(f"\n📊 Method comparison for run {run_id}")
+    print("=" * 60)
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.1f}"))
+    print("=" * 60)
+    return summary
 
-def analyze_failures():
-    """Analyze failures for all methods."""
-    methods = ["zero-shot", "one-shot", "few-shot", "embeddings"]
-    for method in methods:
-        analyze_method_failures(method)
+def run_methods(run_id):
+    """Methods with results stored for a run, in the order they were recorded."""
+    return list(dict.fromkeys(run['method'] for run in load_manifest()['runs'] if run['run_id'] == run_id))
+
+def analyze_failures(run_id=None):
+    """Analyze failures for every method in a run (the latest by default)."""
+    run_id = run_id or latest_run_id()
+    if run_id is None:
+        print("No results found to analyze")
+        return
+    for method in run_methods(run_id):
+        analyze_method_failures(method, run_id)
+    compare_methods(run_id)
 
 if __name__ == "__main__":
     analyze_failures()
\ No newline at end of file
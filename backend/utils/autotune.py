@@ -0,0 +1,118 @@
+import logging
+import time
+from config import DEFAULT_TUNING, EMBEDDING_MODEL
+from extract.prompt_based import extract_airlines_prompt
+from utils.canonicalize import canonicalize_column
+from utils.openai_client import client
+from utils.sequential_eval import evaluation_order
+from utils.string_matcher import match_airline_name
+from utils.tuning import save_tuning_profile
+
+PACKING_GRID = [1, 2, 4, 8]
+CONCURRENCY_GRID = [1, 2, 4, 8, 16, 32]
+EMBEDDING_BATCH_GRID = [1, 8, 32, 128]
+# Concurrency used while the packing factor is searched
+PROBE_CONCURRENCY = 4
+# Stop raising concurrency once throughput improves by less than this
+MIN_GAIN = 0.05
+
+def _pool_errors():
+    return sum(endpoint.rate_limited + endpoint.failures for endpoint in client.endpoints)
+
+def _pool_requests():
+    return sum(endpoint.requests for endpoint in client.endpoints)
+
+def _measure(run, sample_size):
+    """Time a probe and count the API errors and retries it caused."""
+    errors, requests = _pool_errors(), _pool_requests()
+    start = time.perf_counter()
+    try:
+        outcome = run()
+        failed = False
+    except Exception as e:
+        logging.warning(f"Autotune probe failed: {str(e)}")
+        outcome, failed = None, True
+    elapsed = time.perf_counter() - start
+    made = _pool_requests() - requests
+    return outcome, {
+        'tweets_per_sec': 0.0 if failed else sample_size / elapsed,
+        'error_rate': 1.0 if failed else (_pool_errors() - errors) / made if made else 0.0,
+        'seconds': round(elapsed, 2)
+    }
+
+def _probe_prompt(sample, method, concurrency, packing):
+    results, measurement = _measure(
+        lambda: extract_airlines_prompt(sample['tweet'].tolist(), method, track_metrics=False,
+                                        concurrency=concurrency, packing=packing),
+        len(sample)
+    )
+    if results is not None:
+        if len(sample) == 1:
+            results = [results]
+        correct = sum(match_airline_name(result, expected)[0]
+                      for result, expected in zip(canonicalize_column(list(results)), sample['airlines']))
+        measurement['accuracy'] = correct / len(sample) * 100
+    else:
+        measurement['accuracy'] = 0.0
+    measurement.update({'method': method, 'concurrency': concurrency, 'packing': packing})
+    print(f"   • concurrency {concurrency:>2}, packing {packing}: {measurement['tweets_per_sec']:.1f} tweets/s, "
+          f"{measurement['accuracy']:.0f}% accurate, {measurement['error_rate']:.0%} errors")
+    return measurement
+
+def _probe_embeddings(tweets, batch_size):
+    def run():
+        for start in range(0, len(tweets), batch_size):
+            client.embeddings.create(input=tweets[start:start + batch_size], model=EMBEDDING_MODEL)
+    _, measurement = _measure(run, len(tweets))
+    measurement['embedding_batch_size'] = batch_size
+    print(f"   • batch {batch_size:>3}: {measurement['tweets_per_sec']:.1f} tweets/s, "
+          f"{measurement['error_rate']:.0%} errors")
+    return measurement
+
+def autotune(data, method="zero-shot", sample_size=40, max_error_rate=0.02, accuracy_tolerance=2.0):
+    """
+    Search concurrency, packing and embedding batch size for the highest
+    tweets/sec on a labelled sample, subject to an API error-rate limit and
+    staying within accuracy_tolerance points of unpacked accuracy.
+    The chosen settings are saved to the tuning profile.
+    """
+    sample = data.loc[evaluation_order(data, stratify=True)[:sample_size]]
+    measurements = []
+    print(f"\n🎛️  Autotuning on {len(sample)} tweets against {', '.join(e.name for e in client.endpoints)}")
+
+    def feasible(measurement, baseline):
+        return (measurement['error_rate'] <= max_error_rate and
+                measurement['accuracy'] >= baseline - accuracy_tolerance)
+
+    print("📦 Packing factor:")
+    packing_runs = [_probe_prompt(sample, method, PROBE_CONCURRENCY, packing) for packing in PACKING_GRID]
+    measurements += packing_runs
+    baseline = packing_runs[0]['accuracy']
+    best = max((run for run in packing_runs if feasible(run, baseline)),
+               key=lambda run: run['tweets_per_sec'], default=packing_runs[0])
+    packing = best['packing']
+
+    print("🔀 Concurrency:")
+    best = None
+    for concurrency in CONCURRENCY_GRID:
+        run = _probe_prompt(sample, method, concurrency, packing)
+        measurements.append(run)
+        if not feasible(run, baseline):
+            break
+        if best and run['tweets_per_sec'] < best['tweets_per_sec'] * (1 + MIN_GAIN):
+            # Past the knee of the curve; a gain under MIN_GAIN keeps the smaller setting
+            break
+        best = run
+    concurrency = best['concurrency'] if best else DEFAULT_TUNING['concurrency']
+
+    print("🧮 Embedding batch size:")
+    embedding_runs = [_probe_embeddings(sample['tweet'].tolist(), size) for size in EMBEDDING_BATCH_GRID]
+    measurements += embedding_runs
+    best = max((run for run in embedding_runs if run['error_rate'] <= max_error_rate),
+               key=lambda run: run['tweets_per_sec'], default=None)
+    embedding_batch_size = best['embedding_batch_size'] if best else DEFAULT_TUNING['embedding_batch_size']
+
+    settings = {'concurrency': concurrency, 'packing': packing, 'embedding_batch_size': embedding_batch_size}
+    path = save_tuning_profile(settings, measurements, [endpoint.name for endpoint in client.endpoints])
+    print(f"\n✅ Tuned settings {settings} saved to {path}")
+    return settings
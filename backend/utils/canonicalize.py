@@ -0,0 +1,158 @@
+import re
+from collections import Counter, defaultdict
+from functools import lru_cache
+import pandas as pd
+from config import TRAIN_DATA_PATH
+from utils.labels import LabelArray
+
+NO_AIRLINE = "No airline found"
+
+# Handles and spellings that can't be learned from labels alone
+SEED_ALIASES = {
+    'usairways': 'US Airways',
+    'southwestair': 'Southwest Airlines',
+    'americanair': 'American Airlines',
+}
+
+# Brand stems of airline accounts, so their handles are recognized even
+# without training data or when a handle is a variant of the learned alias
+AIRLINE_HANDLE_STEMS = ('united', 'delta', 'jetblue', 'virginamerica', 'usairways', 'southwest',
+                        'americanair', 'alaskaair', 'spiritairlines', 'flyfrontier', 'hawaiianair', 'allegiant')
+# Minimum length of a canonical-name word used as a handle stem ("US" is too short)
+_MIN_STEM_LENGTH = 4
+
+_SPLIT_PATTERN = re.compile(r'\s*(?:,|;|\n|\band\b|&)\s*')
+_LIST_PREFIX = re.compile(r'^\s*(?:\d+[.)]|[-*•])\s*')
+_ANSWER_PREFIX = re.compile(r'^\s*airlines?\s*:\s*', re.IGNORECASE)
+_KEY_PATTERN = re.compile(r'[^a-z0-9]')
+_MENTION_PATTERN = re.compile(r'@(\w+)')
+
+_alias_table = None
+
+def normalize_key(name):
+    """Lookup key for an airline name: lowercase alphanumerics only."""
+    return _KEY_PATTERN.sub('', name.lower())
+
+def split_airlines(text):
+    """
+    Split a raw label or model answer into cleaned airline names.
+    Handles list literals, quotes, numbered or bulleted lists and
+    comma/'and'-separated answers.
+    """
+    if not isinstance(text, str):
+        return []
+    text = _ANSWER_PREFIX.sub('', text.strip().strip('[]'))
+    names = []
+    for part in _SPLIT_PATTERN.split(text):
+        part = _LIST_PREFIX.sub('', part).strip().strip('\'"').strip()
+        part = _ANSWER_PREFIX.sub('', part)
+        if part:
+            names.append(part)
+    return names
+
+def build_alias_table(training_file=None):
+    """
+    Learn an alias -> canonical name table from training labels.
+    Every labelled spelling maps to its most common form, and @handles
+    that consistently co-occur with a single label map to that label.
+    """
+    df = pd.read_csv(training_file or TRAIN_DATA_PATH)
+
+    spellings = defaultdict(Counter)
+    handles = defaultdict(Counter)
+    for tweet, label in zip(df['tweet'], df['airlines']):
+        names = split_airlines(label)
+        for name in names:
+            spellings[normalize_key(name)][name] += 1
+        if len(names) == 1 and isinstance(tweet, str):
+            for handle in _MENTION_PATTERN.findall(tweet):
+                handles[normalize_key(handle)][names[0]] += 1
+
+    table = {key: counts.most_common(1)[0][0] for key, counts in spellings.items()}
+    for key, counts in handles.items():
+        name, count = counts.most_common(1)[0]
+        if key not in table and count >= 2 and count / sum(counts.values()) >= 0.5:
+            table[key] = name
+    for key, name in SEED_ALIASES.items():
+        table.setdefault(key, table.get(normalize_key(name), name))
+    table[normalize_key(NO_AIRLINE)] = NO_AIRLINE
+    return table
+
+def get_alias_table():
+    """Alias table learned from the training data, built once per process."""
+    global _alias_table
+    if _alias_table is None:
+        try:
+            _alias_table = build_alias_table()
+        except FileNotFoundError:
+            _alias_table = {key: name for key, name in SEED_ALIASES.items()}
+            _alias_table[normalize_key(NO_AIRLINE)] = NO_AIRLINE
+    return _alias_table
+
+def _handle_stems(table):
+    stems = set(AIRLINE_HANDLE_STEMS) | set(SEED_ALIASES)
+    for name in set(table.values()) - {NO_AIRLINE}:
+        stems.add(normalize_key(name))
+        first_word = normalize_key(name.split()[0]) if name.split() else ''
+        if len(first_word) >= _MIN_STEM_LENGTH:
+            stems.add(first_word)
+    stems.discard('')
+    return stems
+
+_stems_for = (None, set())
+
+def is_airline_handle(handle):
+    """
+    Whether an @handle belongs to an airline: a known alias, or a handle
+    containing a known airline's name or brand stem (e.g. @JetBlue, @united,
+    @DeltaAssist).
+    """
+    global _stems_for
+    table = get_alias_table()
+    key = normalize_key(handle)
+    if table.get(key, NO_AIRLINE) != NO_AIRLINE:
+        return True
+    if _stems_for[0] is not table:
+        _stems_for = (table, _handle_stems(table))
+    return any(stem in key for stem in _stems_for[1])
+
+def canonical_names(text):
+    """Canonical airline names in a label or answer, in order, without duplicates."""
+    table = get_alias_table()
+    names = []
+    for name in split_airlines(text):
+        canonical = table.get(normalize_key(name), name)
+        if canonical not in names:
+            names.append(canonical)
+    if len(names) > 1 and NO_AIRLINE in names:
+        names.remove(NO_AIRLINE)
+    return names
+
+@lru_cache(maxsize=65536)
+def canonicalize(text):
+    """
+    Canonical comma-separated form of a label or answer. Names are sorted
+    so the same set of airlines always yields the same key. A missing or
+    empty answer (a failed extraction) stays None rather than counting as
+    "No airline found".
+    """
+    if not isinstance(text, str) or not text.strip():
+        return None
+    names = canonical_names(text)
+    return ', '.join(sorted(names)) if names else NO_AIRLINE
+
+def canonicalize_column(values):
+    """
+    Canonicalize a whole column at once. Each distinct value is resolved
+    once and mapped back, so repeated labels cost a single lookup. The
+    result is a categorical Series of canonical labels, missing where an
+    extraction failed.
+    """
+    if isinstance(values, LabelArray):
+        return pd.Series(values.map_vocabulary(canonicalize).to_categorical())
+    series = pd.Series(values, dtype=object)
+    codes, uniques = pd.factorize(series.fillna(''))
+    resolved = [canonicalize(value) for value in uniques]
+    categories = pd.Index(dict.fromkeys(label for label in resolved if label is not None), dtype=object)
+    return pd.Series(pd.Categorical.from_codes(categories.get_indexer(resolved)[codes], categories=categories),
+                     index=series.index)
@@ -0,0 +1,95 @@
+import gzip
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from openai.types import CreateEmbeddingResponse
+from openai.types.chat import ChatCompletion
+from config import MODEL
+
+# Response type of each routed resource, used to rebuild replayed responses
+RESPONSE_TYPES = {"chat.completions": ChatCompletion, "embeddings": CreateEmbeddingResponse}
+
+def request_key(path, kwargs):
+    """Stable key of a routed request."""
+    return json.dumps([path, kwargs], sort_keys=True, default=str)
+
+class Cassette:
+    """
+    Gzipped JSON-lines recording of chat and embedding request/response
+    pairs with the latency observed for each. In replay mode responses are
+    served from the recording after sleeping the original latency divided
+    by speed (speed=0 replays instantly).
+    """
+
+    def __init__(self, path, mode, speed=1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.recorded = 0
+        self.played = 0
+        self.misses = 0
+        if mode == "record":
+            self.file = gzip.open(path, 'wt', encoding='utf-8')
+            self._write({'cassette': 1, 'model': MODEL, 'recorded': datetime.now().isoformat(timespec='seconds')})
+        else:
+            self.file = None
+            self.interactions = defaultdict(list)
+            # Next recording to serve for each key; repeated requests replay in recorded order
+            self.positions = defaultdict(int)
+            self._load()
+
+    def _write(self, entry):
+        self.file.write(json.dumps(entry) + "\n")
+
+    def _load(self):
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            for line in f:
+                entry = json.loads(line)
+                self.interactions[entry['key']].append(entry)
+        if header.get('model') != MODEL:
+            logging.warning(f"Cassette {self.path} was recorded with {header.get('model')}, not {MODEL}")
+        logging.info(f"Loaded {sum(map(len, self.interactions.values())):,} interactions from {self.path}")
+
+    def record(self, path, kwargs, response, latency):
+        """Append one request/response pair."""
+        entry = {'key': request_key(path, kwargs), 'path': path,
+                 'latency': round(latency, 4), 'response': response.model_dump(mode='json')}
+        with self.lock:
+            self._write(entry)
+            self.recorded += 1
+
+    def play(self, path, kwargs):
+        """Serve the recorded response to a request, with its recorded timing."""
+        key = request_key(path, kwargs)
+        with self.lock:
+            entries = self.interactions.get(key)
+            if not entries:
+                self.misses += 1
+                raise LookupError(f"No recorded {path} response for this request in {self.path}; "
+                                  f"record the cassette again")
+            # Once a key's recordings run out keep serving the last one
+            entry = entries[min(self.positions[key], len(entries) - 1)]
+            self.positions[key] += 1
+            self.played += 1
+        if self.speed:
+            time.sleep(entry['latency'] / self.speed)
+        return RESPONSE_TYPES[path].model_validate(entry['response'])
+
+    def close(self):
+        if self.file is not None:
+            with self.lock:
+                self.file.close()
+                self.file = None
+
+    def format_stats(self):
+        if self.mode == "record":
+            return f"Recorded {self.recorded:,} responses to {self.path}"
+        return (f"Replayed {self.played:,} responses from {self.path} "
+                f"at {self.speed:g}x speed, {self.misses:,} missing")
@@ -1,55 +1,112 @@
+import hashlib
+import os
 import pandas as pd
+import pyarrow.feather as feather
 import logging
 from pathlib import Path
-from config import DATA_PATH, OUTPUT_DIR
+from config import DATA_PATH, OUTPUT_DIR, TRAIN_DATA_PATH, DATASET_CACHE_DIR
 from utils.string_matcher import match_airline_name
+from utils.results_store import append_results, new_run_id
+from utils.canonicalize import canonicalize_column, NO_AIRLINE
+from utils.profiler import traced
 from datetime import datetime
 
 def get_timestamp():
     """Get current timestamp formatted for filenames."""
     return datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
-def clean_airlines_field(airlines_str):
-    """Clean the airlines field by removing brackets and quotes."""
-    return airlines_str.strip('[]\'\"').replace("'", "")
+# Bump when the cleaning applied by load_dataset changes
+DATASET_CACHE_VERSION = 2
 
+# Cleaned DataFrames already loaded by this process, by cache path
+_frames = {}
+
+def _file_stamp(path):
+    stat = Path(path).stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+def _cache_path(path):
+    """
+    Cache file for a dataset. The name changes whenever the source file,
+    the training data behind the alias table or the cleaning changes.
+    """
+    path = Path(path).resolve()
+    source_key = hashlib.sha1(str(path).encode()).hexdigest()[:12]
+    training = _file_stamp(TRAIN_DATA_PATH) if TRAIN_DATA_PATH.exists() else "none"
+    version_key = hashlib.sha1(f"{_file_stamp(path)}|{training}|{DATASET_CACHE_VERSION}".encode()).hexdigest()[:12]
+    return DATASET_CACHE_DIR / f"{path.stem}-{source_key}-{version_key}.arrow", source_key
+
+def _write_cache(df, cache_path, source_key):
+    DATASET_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    # Uncompressed: the file is small next to the CSV parse it saves, and loads skip decompression
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    feather.write_feather(df, tmp_path, compression='uncompressed')
+    tmp_path.replace(cache_path)
+    for stale in DATASET_CACHE_DIR.glob(f"*-{source_key}-*.arrow"):
+        if stale != cache_path:
+            stale.unlink(missing_ok=True)
+
+@traced()
 def load_dataset(path=DATA_PATH):
-    """Load dataset from CSV file."""
+    """
+    Load a dataset with cleaned airline labels. The first load parses the
+    CSV and writes an Arrow copy to DATASET_CACHE_DIR; later processes read
+    that copy instead of re-parsing. Within a process the converted DataFrame
+    is kept, and each call gets its own copy to modify.
+    """
     try:
+        cache_path, source_key = _cache_path(path)
+        df = _frames.get(cache_path)
+        if df is not None:
+            # Copies the column arrays, not the strings they point to
+            return df.copy()
+        if cache_path.exists():
+            logging.info(f"Loading dataset from cache {cache_path}")
+            df = feather.read_feather(cache_path, memory_map=False)
+            _frames[cache_path] = df
+            return df.copy()
+        
         logging.info(f"Loading dataset from {path}")
         df = pd.read_csv(path)
-        df['airlines'] = df['airlines'].apply(clean_airlines_field)
-        return df
+        # An unlabelled row means no airline; only extraction failures stay missing
+        labels = df['airlines'].fillna('').astype(str)
+        df['airlines'] = canonicalize_column(labels.mask(labels.str.strip() == '', NO_AIRLINE))
+        try:
+            _write_cache(df, cache_path, source_key)
+        except OSError as e:
+            logging.warning(f"Could not write dataset cache: {str(e)}")
+        _frames[cache_path] = df
+        return df.copy()
     except Exception as e:
         logging.error(f"Error loading dataset: {str(e)}")
         raise
 
-def save_results(results, method):
-    """Save extraction results to CSV file."""
+def build_results_frame(results, data):
+    """Pair extracted results with the dataset rows they came from."""
+    # Build typed columns instead of per-row dicts
+    scores = [match_airline_name(extracted, correct)
+              for extracted, correct in zip(canonicalize_column(results), data['airlines'])]
+    return pd.DataFrame({
+        'row_id': data.index[:len(scores)],
+        'tweet': data['tweet'].iloc[:len(scores)].values,
+        'expected': data['airlines'].iloc[:len(scores)].values,
+        'extracted': list(results[:len(scores)]),
+        'exact_match': [is_exact for is_exact, _ in scores],
+        'similarity': [similarity for _, similarity in scores]
+    })
+
+@traced()
+def save_results(results, method, data=None, run_id=None, dataset=DATA_PATH):
+    """Append extraction results to the columnar results store."""
     try:
-        timestamp = get_timestamp()
-        output_path = OUTPUT_DIR / f"results_{method}_{timestamp}.csv"
+        run_id = run_id or new_run_id()
         
         # Load original dataset to get tweets and correct airlines
-        data = load_dataset()
-        
-        # Create results DataFrame with all required columns
-        results_data = []
-        for i, (tweet, extracted) in enumerate(zip(data['tweet'], results)):
-            correct = data['airlines'].iloc[i]
-            is_exact, similarity = match_airline_name(extracted, correct)
-            
-            results_data.append({
-                'tweet': tweet,
-                'correct': correct,
-                'extracted': extracted,
-                'exact_match': is_exact,
-                'similarity': f"{similarity:.1f}"
-            })
+        if data is None:
+            data = load_dataset(dataset)
         
-        # Convert to DataFrame and save
-        df = pd.DataFrame(results_data)
-        df.to_csv(output_path, index=False)
+        df = build_results_frame(results, data)
+        output_path = append_results(df, run_id, method, dataset=dataset)
         logging.info(f"Results saved to {output_path}")
         return output_path
     except Exception as e:
@@ -70,6 +127,8 @@ def save_comparison_metrics(all_metrics):
                 'Time/Tweet': f"{metrics.avg_time_per_tweet*1000:.1f}ms",
                 'Total Tokens': metrics.total_tokens,
                 'Tokens/Tweet': f"{metrics.avg_tokens_per_tweet:.1f}",
+                'Cached Input': f"{metrics.cache_hit_rate:.1f}%",
+                'Tweet Tokens Cut': f"{metrics.tweet_tokens_saved_rate:.1f}%",
                 'Cost/Tweet': f"${metrics.avg_cost_per_tweet:.4f}"
             })
         
@@ -77,6 +136,27 @@ def save_comparison_metrics(all_metrics):
         output_path = OUTPUT_DIR / f"comparison_summary_{timestamp}.csv"
         df.to_csv(output_path, index=False)
         logging.info(f"Comparison metrics saved to {output_path}")
+        
+        # Per-airline and per-length breakdown from each method's slice stats
+        slice_data = []
+        for method, metrics in all_metrics.items():
+            for key, stats in metrics.slice_stats.items():
+                kind, value = key.split('=', 1)
+                tweets = stats['tweets']
+                slice_data.append({
+                    'Method': metrics.method_name,
+                    'Slice': kind,
+                    'Value': value,
+                    'Tweets': tweets,
+                    'Accuracy': f"{stats['exact'] / tweets * 100:.1f}%",
+                    'Avg Similarity': f"{stats['similarity'] / tweets:.1f}%",
+                    'Time/Tweet': f"{stats['time'] / tweets * 1000:.1f}ms",
+                    'Cost/Tweet': f"${stats['cost'] / tweets:.4f}"
+                })
+        if slice_data:
+            slices_path = OUTPUT_DIR / f"comparison_slices_{timestamp}.csv"
+            pd.DataFrame(slice_data).to_csv(slices_path, index=False)
+            logging.info(f"Per-slice metrics saved to {slices_path}")
         return output_path
     except Exception as e:
         logging.error(f"Error saving comparison metrics: {str(e)}")
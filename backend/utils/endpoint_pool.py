@@ -0,0 +1,241 @@
+import json
+import logging
+import threading
+import time
+import openai
+from utils.log_pipeline import log_event
+
+# Routed resources; anything else (files, fine-tuning jobs, models) goes to the primary endpoint
+ROUTED = ("chat.completions", "embeddings")
+# Errors worth retrying on another endpoint
+FAILOVER_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+FAILURE_COOLDOWN = 5.0
+RATE_LIMIT_COOLDOWN = 1.0
+# Cooldowns without a server hint double with each consecutive failure, up to this
+MAX_COOLDOWN = 30.0
+# Attempts beyond one per endpoint; each waits for the first endpoint to come off cooldown
+EXTRA_ATTEMPTS = 4
+# Stands in for a missing key so clients can be built; never sent (see require_keys)
+_MISSING_KEY = "missing"
+
+def _parse_reset(value):
+    """Seconds from an x-ratelimit-reset header such as '1s', '250ms' or '6m0s'."""
+    if not value:
+        return None
+    try:
+        if value.endswith('ms'):
+            return float(value[:-2]) / 1000
+        seconds = 0.0
+        number = ''
+        for char in value:
+            if char.isdigit() or char == '.':
+                number += char
+            else:
+                seconds += float(number) * {'h': 3600, 'm': 60, 's': 1}[char]
+                number = ''
+        return seconds + float(number or 0)
+    except (ValueError, KeyError):
+        return None
+
+class Endpoint:
+    """One API key / base URL pair and its live routing state."""
+
+    def __init__(self, name, api_key, base_url=None):
+        self.name = name
+        self.has_key = bool(api_key)
+        # Retries are handled by the pool, which can move to another endpoint
+        self.client = openai.OpenAI(api_key=api_key or _MISSING_KEY, base_url=base_url, max_retries=0)
+        self.outstanding = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.rate_limited = 0
+        # Consecutive failed requests, for exponential backoff
+        self.streak = 0
+
+    def resource(self, path):
+        target = self.client
+        for part in path.split('.'):
+            target = getattr(target, part)
+        return target
+
+class EndpointPool:
+    """
+    Spreads chat and embedding requests over several API keys or base URLs.
+    Each request goes to the available endpoint with the fewest requests in
+    flight. Endpoints that are rate limited or failing are rested and the
+    request moves to another one.
+    """
+
+    def __init__(self, endpoints):
+        if not endpoints:
+            raise ValueError("At least one endpoint is required")
+        self.endpoints = [
+            Endpoint(spec.get('name') or f"endpoint-{i}", spec.get('api_key'), spec.get('base_url'))
+            for i, spec in enumerate(endpoints)
+        ]
+        self.condition = threading.Condition()
+        # Set by enable_cache()
+        self.cache = None
+        self.cache_hits = 0
+        self.cache_lock = threading.Lock()
+        # Set by use_cassette()
+        self.cassette = None
+
+    def __getattr__(self, name):
+        # Non-routed resources such as files and fine_tuning
+        self.require_keys()
+        return getattr(self.endpoints[0].client, name)
+
+    def require_keys(self):
+        """Raise if any endpoint has no API key. Replaying a cassette needs none."""
+        for endpoint in self.endpoints:
+            if not endpoint.has_key:
+                if endpoint.name == "default":
+                    raise ValueError("❌ OPENAI_API_KEY not found in environment variables. "
+                                     "Please add it to your .env file.")
+                raise ValueError(f"❌ No API key for endpoint {endpoint.name}")
+
+    @property
+    def chat(self):
+        return _Route(self, "chat")
+
+    @property
+    def embeddings(self):
+        return _Route(self, "embeddings")
+
+    def _acquire(self):
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                available = [e for e in self.endpoints if e.cooldown_until <= now]
+                if available:
+                    endpoint = min(available, key=lambda e: (e.outstanding, e.requests))
+                    endpoint.outstanding += 1
+                    endpoint.requests += 1
+                    return endpoint
+                # Every endpoint is resting; wait for the first to come back
+                self.condition.wait(timeout=min(e.cooldown_until for e in self.endpoints) - now)
+
+    def _release(self, endpoint, cooldown=None, failed=False):
+        with self.condition:
+            endpoint.outstanding -= 1
+            endpoint.streak = endpoint.streak + 1 if failed else 0
+            if cooldown:
+                endpoint.cooldown_until = max(endpoint.cooldown_until, time.monotonic() + cooldown)
+            self.condition.notify_all()
+
+    def enable_cache(self):
+        """
+        Reuse responses to identical requests for the rest of the process.
+        Only safe because every call is made at temperature 0.
+        """
+        if self.cache is None:
+            self.cache = {}
+
+    def use_cassette(self, cassette):
+        """Record routed traffic to, or replay it from, a Cassette."""
+        self.cassette = cassette
+
+    def request(self, path, **kwargs):
+        """Call a routed resource's create(), failing over between endpoints."""
+        if self.cache is None:
+            return self._send(path, kwargs)
+        key = (path, json.dumps(kwargs, sort_keys=True, default=str))
+        with self.cache_lock:
+            cached = self.cache.get(key)
+        if cached is not None:
+            with self.cache_lock:
+                self.cache_hits += 1
+            return _without_usage(cached)
+        response = self._send(path, kwargs)
+        with self.cache_lock:
+            self.cache[key] = response
+        return response
+
+    def _send(self, path, kwargs):
+        if self.cassette is None:
+            return self._request(path, **kwargs)
+        if self.cassette.mode == "replay":
+            return self.cassette.play(path, kwargs)
+        start = time.perf_counter()
+        response = self._request(path, **kwargs)
+        # Latency includes any failover, as the caller saw it
+        self.cassette.record(path, kwargs, response, time.perf_counter() - start)
+        return response
+
+    def _backoff(self, endpoint, base):
+        return min(base * 2 ** endpoint.streak, MAX_COOLDOWN)
+
+    def _request(self, path, **kwargs):
+        self.require_keys()
+        # With every endpoint resting, _acquire() sleeps until the first comes back,
+        # so a single endpoint still gets exponential-backoff retries
+        attempts = len(self.endpoints) + EXTRA_ATTEMPTS
+        for attempt in range(attempts):
+            endpoint = self._acquire()
+            cooldown = None
+            failed = False
+            start = time.perf_counter()
+            try:
+                raw = endpoint.resource(path).with_raw_response.create(**kwargs)
+                headers = raw.headers
+                log_event("api_request", endpoint=endpoint.name, path=path, model=kwargs.get('model'),
+                          latency_ms=round((time.perf_counter() - start) * 1000, 1),
+                          remaining_requests=headers.get('x-ratelimit-remaining-requests'))
+                # Rest the endpoint until its window resets once its quota is used up
+                if headers.get('x-ratelimit-remaining-requests') == '0':
+                    cooldown = _parse_reset(headers.get('x-ratelimit-reset-requests'))
+                return raw.parse()
+            except FAILOVER_ERRORS as e:
+                failed = True
+                if isinstance(e, openai.RateLimitError):
+                    endpoint.rate_limited += 1
+                    headers = e.response.headers
+                    retry_after = headers.get('retry-after')
+                    cooldown = (float(retry_after) if retry_after
+                                else _parse_reset(headers.get('x-ratelimit-reset-requests'))
+                                or self._backoff(endpoint, RATE_LIMIT_COOLDOWN))
+                else:
+                    endpoint.failures += 1
+                    cooldown = self._backoff(endpoint, FAILURE_COOLDOWN)
+                # Failover is routine; the caller logs the error if every attempt fails
+                logging.info(f"{endpoint.name} failed ({type(e).__name__}), "
+                             f"attempt {attempt + 1}/{attempts}")
+                if attempt == attempts - 1:
+                    raise
+            finally:
+                self._release(endpoint, cooldown, failed)
+
+    def format_stats(self):
+        """Per-endpoint request counts."""
+        lines = [f"{'Endpoint':<20} {'Requests':>9} {'429s':>6} {'Failures':>9}"]
+        for endpoint in self.endpoints:
+            lines.append(f"{endpoint.name:<20} {endpoint.requests:>9,} "
+                         f"{endpoint.rate_limited:>6,} {endpoint.failures:>9,}")
+        if self.cache is not None:
+            lines.append(f"Response cache: {self.cache_hits:,} hits, {len(self.cache):,} entries")
+        return "\n".join(lines)
+
+def _without_usage(response):
+    """Copy of a cached response reporting zero tokens, since nothing was billed."""
+    usage = getattr(response, 'usage', None)
+    if usage is None:
+        return response
+    zero = usage.model_copy(update={name: 0 if isinstance(value, int) else None for name, value in usage})
+    return response.model_copy(update={'usage': zero})
+
+class _Route:
+    """Attribute path into the pool, e.g. pool.chat.completions.create(...)."""
+
+    def __init__(self, pool, path):
+        self.pool = pool
+        self.path = path
+
+    def __getattr__(self, name):
+        return _Route(self.pool, f"{self.path}.{name}")
+
+    def create(self, **kwargs):
+        if self.path not in ROUTED:
+            raise AttributeError(f"{self.path} is not routed by the endpoint pool")
+        return self.pool.request(self.path, **kwargs)
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from config import OUTPUT_DIR, TRAIN_DATA_PATH, LOCAL_MODEL_PATH, MODEL, TEMPERATURE
+from extract.prompts import PROMPTS, TEMPLATES, PACKING_INSTRUCTION
+from extract.cascade import CASCADE_STAGES, load_thresholds
+from extract.normalize import active_normalization
+from extract.fine_tuned import model_prompt_format
+from utils.metrics_tracker import ExtractionMetrics
+from utils.results_store import append_results, load_manifest, query_results
+from utils.string_matcher import SCORER_VERSION
+from utils.tuning import get_tuning
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+EVAL_MANIFEST_PATH = OUTPUT_DIR / "eval_manifest.json"
+EVAL_LOCK_PATH = OUTPUT_DIR / "eval_manifest.lock"
+
+_thread_lock = threading.Lock()
+
+@lru_cache(maxsize=None)
+def _digest(path, stamp):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def file_digest(path):
+    """SHA-256 of a file's bytes, or None if it doesn't exist."""
+    path = Path(path).resolve()
+    if not path.exists():
+        return None
+    stat = path.stat()
+    # Re-hash only when the file changes
+    return _digest(str(path), (stat.st_mtime_ns, stat.st_size))
+
+def _prompt_text(name):
+    template = PROMPTS.get(name)
+    return [template.system, template.user] if template else TEMPLATES[name]
+
+def evaluation_inputs(method, dataset, model_id=None, structured=False):
+    """
+    Everything a (method, dataset) evaluation depends on. Concurrency and
+    embedding batch size only change speed, so they are left out.
+    """
+    inputs = {
+        'method': method,
+        'dataset': file_digest(dataset),
+        # Training labels drive the alias table used to score every method
+        'training_data': file_digest(TRAIN_DATA_PATH),
+        'model': MODEL,
+        'temperature': TEMPERATURE,
+        'scorer': SCORER_VERSION,
+        'normalization': active_normalization(),
+    }
+    if method in ("zero-shot", "one-shot", "few-shot"):
+        inputs['prompt'] = _prompt_text(method)
+        inputs['structured'] = structured
+        # Tweets per request; structured output always sends one
+        packing = 1 if structured else get_tuning()['packing']
+        inputs['packing'] = packing
+        if packing > 1:
+            inputs['packing_instruction'] = PACKING_INSTRUCTION
+    elif method in ("embeddings", "fine-tuned"):
+        inputs['prompt'] = _prompt_text(method)
+    elif method == "cascade":
+        inputs['prompt'] = {stage: _prompt_text(stage) for stage in CASCADE_STAGES if stage != "local-ml"}
+        inputs['thresholds'] = load_thresholds()
+    if method in ("cascade", "local-ml"):
+        inputs['local_model'] = file_digest(LOCAL_MODEL_PATH)
+    if method in ("fine-tuned", "cascade"):
+        inputs['model_id'] = model_id
+        inputs['prompt_format'] = model_prompt_format(model_id) if model_id else None
+        if method == "fine-tuned" and inputs['prompt_format'] == "compact":
+            inputs['prompt'] = _prompt_text("fine-tuned-compact")
+    return inputs
+
+def fingerprint(inputs):
+    """Content hash of evaluation inputs."""
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+@contextmanager
+def _eval_manifest_lock():
+    """Serialize eval manifest updates across threads and processes (shards, jobs)."""
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+        with open(EVAL_LOCK_PATH, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def load_eval_manifest():
+    if not EVAL_MANIFEST_PATH.exists():
+        return {}
+    with open(EVAL_MANIFEST_PATH) as f:
+        return json.load(f)
+
+def _key(method, dataset):
+    return f"{method}|{Path(dataset).resolve()}"
+
+def record_evaluation(method, dataset, run_id, metrics, model_id=None, structured=False):
+    """Remember the inputs behind a finished evaluation and where its results are."""
+    entry = {
+        'fingerprint': fingerprint(evaluation_inputs(method, dataset, model_id, structured)),
+        'run_id': run_id,
+        'recorded': datetime.now().isoformat(timespec='seconds'),
+        'metrics': metrics.to_dict()
+    }
+    # Re-read under the lock so concurrent evaluations don't drop each other's entries
+    with _eval_manifest_lock():
+        manifest = load_eval_manifest()
+        manifest[_key(method, dataset)] = entry
+        # A private temporary file per writer; the rename is atomic
+        with tempfile.NamedTemporaryFile('w', dir=OUTPUT_DIR, prefix='eval_manifest.', suffix='.tmp',
+                                         delete=False) as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f.name, EVAL_MANIFEST_PATH)
+
+def reuse_evaluation(method, dataset, run_id, model_id=None, structured=False):
+    """
+    Return the stored metrics of an evaluation whose inputs are unchanged,
+    copying its results into the current run. Returns None if it must be rerun.
+    """
+    entry = load_eval_manifest().get(_key(method, dataset))
+    if entry is None or entry['fingerprint'] != fingerprint(evaluation_inputs(method, dataset, model_id, structured)):
+        return None
+    stored = any(run['run_id'] == entry['run_id'] and run['method'] == method for run in load_manifest()['runs'])
+    if not stored:
+        return None
+
+    if entry['run_id'] != run_id:
+        results = query_results(run_id=entry['run_id'], method=method)
+        append_results(results, run_id, method, dataset=dataset)
+    print(f"♻️  Reusing {method} results from run {entry['run_id']} (inputs unchanged)")
+    logging.info(f"Reused {method} evaluation {entry['fingerprint']} from run {entry['run_id']}")
+    return ExtractionMetrics(**entry['metrics'])
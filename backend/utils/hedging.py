@@ -0,0 +1,106 @@
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import numpy as np
+from config import HEDGE_PERCENTILE, HEDGE_BUDGET, HEDGE_INITIAL_DELAY, HEDGE_MIN_SAMPLES
+
+class Hedger:
+    """
+    Sends a duplicate of a slow request once it passes an adaptive deadline
+    (a percentile of recent latencies) and uses whichever finishes first.
+    Latencies are kept per key (the model), so chat and embedding calls each
+    get their own deadline. Hedges are capped at a fraction of all requests.
+    """
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, budget=HEDGE_BUDGET, initial_delay=HEDGE_INITIAL_DELAY,
+                 min_samples=HEDGE_MIN_SAMPLES, window=500, max_workers=16):
+        self.percentile = percentile
+        self.budget = budget
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.latencies = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.extra_tokens = 0
+
+    def deadline(self, key=None):
+        """Seconds to wait before hedging a request with this key."""
+        with self.lock:
+            latencies = self.latencies.get(key, ())
+            if len(latencies) < self.min_samples:
+                return self.initial_delay
+            return float(np.percentile(latencies, self.percentile))
+
+    def _timed(self, call, key, started=None):
+        if started is not None:
+            started.set()
+        start = time.perf_counter()
+        response = call()
+        with self.lock:
+            self.latencies.setdefault(key, deque(maxlen=self.window)).append(time.perf_counter() - start)
+        return response
+
+    def _can_hedge(self):
+        with self.lock:
+            # One hedge of headroom so short interactive sessions can hedge too
+            if self.hedges_sent >= self.budget * self.requests + 1:
+                return False
+            self.hedges_sent += 1
+            return True
+
+    def _count_loser(self, future):
+        """Add the tokens of a discarded response to the hedging overhead."""
+        if future.cancelled() or future.exception() is not None:
+            return
+        usage = getattr(future.result(), 'usage', None)
+        if usage is not None:
+            with self.lock:
+                self.extra_tokens += usage.total_tokens
+
+    def call(self, call, key=None):
+        """Run call(), hedging it if it is slower than the current deadline for its key."""
+        with self.lock:
+            self.requests += 1
+        started = threading.Event()
+        primary = self.executor.submit(self._timed, call, key, started)
+        # The deadline runs from when the request is sent, not from when it
+        # was queued behind other requests for a worker thread
+        started.wait()
+        done, _ = wait([primary], timeout=self.deadline(key))
+        if done or not self._can_hedge():
+            return primary.result()
+
+        logging.info("Hedging slow request")
+        hedge = self.executor.submit(self._timed, call, key)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # A synchronous HTTP call can't be interrupted, so the
+                    # loser is cancelled if not started and otherwise discarded
+                    for loser in pending:
+                        loser.cancel()
+                        loser.add_done_callback(self._count_loser)
+                    if future is hedge:
+                        with self.lock:
+                            self.hedges_won += 1
+                    return future.result()
+        # Both attempts failed
+        return primary.result()
+
+    def format_stats(self):
+        """Summary of hedging activity."""
+        rate = (self.hedges_sent / self.requests) * 100 if self.requests else 0
+        deadlines = ", ".join(f"{key} {self.deadline(key) * 1000:.0f}ms" for key in list(self.latencies))
+        return (f"Requests: {self.requests:,}\n"
+                f"Hedges Sent: {self.hedges_sent:,} ({rate:.1f}%)\n"
+                f"Hedges Won: {self.hedges_won:,}\n"
+                f"Extra Tokens: {self.extra_tokens:,}\n"
+                f"Current Deadlines: {deadlines or 'none'}")
@@ -0,0 +1,140 @@
+import logging
+import tomllib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+import pandas as pd
+from config import COSTS, MODEL, OUTPUT_DIR, ROOT_DIR
+from utils.data_loader import get_timestamp
+from extract.prompts import PROMPTS
+
+# Methods that run once per fine-tuned model ID
+MODEL_METHODS = ("fine-tuned", "cascade")
+
+# Rough API calls per tweet and billing for the cost estimate used to order jobs
+_CALLS_PER_TWEET = {"embeddings": 3, "cascade": 1.5}
+_ASSUMED_TOKENS = {"embeddings": 400}
+_TWEET_TOKENS = 40
+
+@dataclass
+class Job:
+    """One dataset × method (× model) cell of the run matrix."""
+    dataset: Path
+    method: str
+    model_id: str = None
+    priority: int = 0
+    rows: int = 0
+    estimated_cost: float = 0.0
+
+    @property
+    def name(self) -> str:
+        """Method name, with the fine-tuned model it runs against."""
+        if not self.model_id:
+            return self.method
+        return f"{self.method}-{self.model_id.rsplit(':', 1)[-1]}"
+
+    @property
+    def label(self) -> str:
+        """Method name used in the results store; one partition per dataset."""
+        return f"{self.name}@{self.dataset.stem}"
+
+def load_job_graph(path):
+    """Read a run matrix from a TOML (or, with PyYAML installed, YAML) file."""
+    path = Path(path)
+    if path.suffix in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("PyYAML is required for YAML job files; use TOML or `pip install pyyaml`")
+        with open(path) as f:
+            return yaml.safe_load(f)
+    with open(path, 'rb') as f:
+        return tomllib.load(f)
+
+def estimate_cost(method, rows):
+    """Approximate API cost of running a method over a number of tweets."""
+    if method == "local-ml":
+        return 0.0
+    prompt = PROMPTS.get("few-shot" if method == "cascade" else method)
+    tokens = (prompt.static_tokens if prompt else _ASSUMED_TOKENS.get(method, 200)) + _TWEET_TOKENS
+    rates = COSTS['fine-tuned' if method == "fine-tuned" else MODEL]
+    return rows * _CALLS_PER_TWEET.get(method, 1) * tokens * rates['input'] / 1000
+
+def plan_jobs(graph, methods, count_rows):
+    """
+    Expand a run matrix into jobs, highest priority first and cheapest first
+    within a priority. count_rows(dataset) returns the number of tweets.
+    """
+    priorities = graph.get('priority', {})
+    model_ids = graph.get('model_ids', [])
+    wanted = graph.get('methods', 'all')
+    wanted = methods if wanted == 'all' else wanted
+    unknown = set(wanted) - set(methods)
+    if unknown:
+        raise ValueError(f"Unknown methods in job file: {sorted(unknown)}")
+
+    jobs = []
+    for dataset in graph['datasets']:
+        dataset = Path(dataset)
+        if not dataset.is_absolute():
+            dataset = ROOT_DIR / dataset
+        rows = count_rows(dataset)
+        for method in wanted:
+            if method in MODEL_METHODS:
+                # Cascade can run without a fine-tuned stage; fine-tuned can't
+                variants = model_ids or ([None] if method == "cascade" else [])
+            else:
+                variants = [None]
+            for model_id in variants:
+                priority = priorities.get(method, 0) + priorities.get(dataset.name, 0)
+                jobs.append(Job(dataset, method, model_id, priority, rows, estimate_cost(method, rows)))
+
+    return sorted(jobs, key=lambda job: (-job.priority, job.estimated_cost))
+
+def run_job_graph(jobs, run_job, parallel=1):
+    """
+    Run planned jobs in one process and return a combined summary.
+    run_job(job) must return the job's ExtractionMetrics. Jobs share the
+    process-wide dataset cache, endpoint pool and response cache; results
+    store writes are serialized by the store's manifest lock.
+    """
+    print(f"\n🗂️  Running {len(jobs)} jobs "
+          f"(estimated ${sum(job.estimated_cost for job in jobs):.2f}, {parallel} at a time)")
+    for job in jobs:
+        logging.info(f"Planned {job.name} on {job.dataset.name}: priority {job.priority}, "
+                     f"~${job.estimated_cost:.4f}")
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        futures = {executor.submit(run_job, job): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            row = {'dataset': job.dataset.name, 'method': job.name, 'priority': job.priority}
+            try:
+                metrics = future.result()
+                row.update({
+                    'accuracy': metrics.accuracy,
+                    'similarity': metrics.avg_similarity,
+                    'tweets': metrics.total_tweets,
+                    'tokens': metrics.total_tokens,
+                    'cost': metrics.total_cost,
+                    'time': metrics.total_time,
+                    'status': 'ok'
+                })
+                print(f"✅ {job.name} on {job.dataset.name}: {metrics.accuracy:.1f}%, ${metrics.total_cost:.4f}")
+            except Exception as e:
+                logging.error(f"Job {job.name} on {job.dataset.name} failed: {str(e)}")
+                row['status'] = f"failed: {e}"
+                print(f"❌ {job.name} on {job.dataset.name} failed: {str(e)}")
+            rows.append(row)
+
+    summary = pd.DataFrame(rows).sort_values(['dataset', 'method'])
+    summary_path = OUTPUT_DIR / f"job_summary_{get_timestamp()}.csv"
+    summary.to_csv(summary_path, index=False)
+
+    print("\n📋 Job Summary")
+    print("=" * 80)
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.4f}" if x < 1 else f"{x:.1f}"))
+    print("=" * 80)
+    print(f"📝 Summary: {summary_path}")
+    return summary
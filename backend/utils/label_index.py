@@ -0,0 +1,130 @@
+import json
+import logging
+import numpy as np
+from config import DATA_PATH, TWEET_LENGTH_BUCKETS
+from utils.canonicalize import split_airlines
+from utils.data_loader import load_dataset, _cache_path
+
+# Indexes already built or loaded by this process
+_indexes = {}
+
+def length_bucket(tweet):
+    """Name of the TWEET_LENGTH_BUCKETS bucket a tweet falls in."""
+    length = len(tweet) if isinstance(tweet, str) else 0
+    for name, limit in TWEET_LENGTH_BUCKETS.items():
+        if limit is None or length <= limit:
+            return name
+
+def build_label_index(data):
+    """
+    Inverted index from slice key to the sorted row IDs in that slice.
+    Keys are 'airline=<canonical airline>' for every airline in a row's
+    label (a row labelled with two airlines is in both slices) and
+    'length=<bucket>'.
+    """
+    rows = {}
+    # Labels are already canonical, so each distinct label is split once
+    codes, labels = data['airlines'].astype(object).factorize()
+    airlines_by_code = [split_airlines(label) for label in labels]
+    for row_id, code, tweet in zip(data.index, codes, data['tweet']):
+        keys = [f"airline={airline}" for airline in airlines_by_code[code]] if code >= 0 else []
+        keys.append(f"length={length_bucket(tweet)}")
+        for key in keys:
+            rows.setdefault(key, []).append(row_id)
+    return {key: np.array(sorted(row_ids), dtype=np.int64) for key, row_ids in sorted(rows.items())}
+
+def _save_index(index, path):
+    keys = list(index)
+    offsets = np.cumsum([0] + [len(index[key]) for key in keys])
+    row_ids = np.concatenate([index[key] for key in keys]) if keys else np.array([], dtype=np.int64)
+    tmp_path = path.with_suffix('.tmp.npz')
+    np.savez(tmp_path, keys=np.array(json.dumps(keys)), offsets=offsets, row_ids=row_ids)
+    tmp_path.replace(path)
+
+def _read_index(path):
+    with np.load(path) as stored:
+        keys = json.loads(str(stored['keys']))
+        offsets, row_ids = stored['offsets'], stored['row_ids']
+    return {key: row_ids[offsets[i]:offsets[i + 1]] for i, key in enumerate(keys)}
+
+def get_label_index(path=DATA_PATH):
+    """
+    Label index of a dataset, built once and stored beside its Arrow cache
+    so it is rebuilt only when the dataset or its cleaning changes.
+    """
+    cache_path, source_key = _cache_path(path)
+    index_path = cache_path.with_suffix('.index.npz')
+    index = _indexes.get(index_path)
+    if index is not None:
+        return index
+    if index_path.exists():
+        index = _read_index(index_path)
+    else:
+        index = build_label_index(load_dataset(path))
+        try:
+            index_path.parent.mkdir(parents=True, exist_ok=True)
+            _save_index(index, index_path)
+            for stale in index_path.parent.glob(f"*-{source_key}-*.index.npz"):
+                if stale != index_path:
+                    stale.unlink(missing_ok=True)
+        except OSError as e:
+            logging.warning(f"Could not write label index: {str(e)}")
+    _indexes[index_path] = index
+    return index
+
+def parse_slice(spec):
+    """Split 'airline=US Airways' or 'length=long' into a slice key, checking the kind."""
+    kind, _, value = spec.partition('=')
+    if kind not in ('airline', 'length') or not value:
+        raise ValueError(f"Invalid slice {spec!r}; use airline=<name> or length=<{'|'.join(TWEET_LENGTH_BUCKETS)}>")
+    return f"{kind}={value.strip()}"
+
+def select_slice(data, index, key):
+    """Rows of the dataset in one slice of its label index."""
+    if key not in index:
+        available = ', '.join(k for k in index if k.startswith(key.split('=')[0]))
+        raise ValueError(f"No rows in slice {key!r}; available: {available}")
+    return data.loc[data.index.intersection(index[key])]
+
+def stratified_sample(data, index, size, seed=0):
+    """
+    Random sample of about size rows with each airline slice represented in
+    proportion to its share of the dataset, and at least one row from each.
+    """
+    rng = np.random.default_rng(seed)
+    available = data.index.to_numpy()
+    chosen = set()
+    for key, row_ids in index.items():
+        if not key.startswith("airline="):
+            continue
+        row_ids = row_ids[np.isin(row_ids, available)]
+        if not len(row_ids):
+            continue
+        take = min(len(row_ids), max(1, round(size * len(row_ids) / len(data))))
+        chosen.update(rng.choice(row_ids, take, replace=False).tolist())
+    return data.loc[sorted(chosen)]
+
+def slice_stats(index, row_ids, exact, similarity, costs, latencies):
+    """
+    Per-slice sums of tweets, exact matches, similarity, cost and time for
+    the scored rows. Sums, so stats of batches and shards add up.
+    """
+    row_ids = np.asarray(row_ids, dtype=np.int64)
+    columns = {}
+    for name, values in (('exact', exact), ('similarity', similarity), ('cost', costs), ('time', latencies)):
+        column = np.zeros(len(row_ids))
+        # Extractors that don't time each tweet leave latencies empty
+        values = np.asarray(values, dtype=np.float64)[:len(row_ids)]
+        column[:len(values)] = values
+        columns[name] = column
+
+    stats = {}
+    for key, slice_ids in index.items():
+        in_slice = np.isin(row_ids, slice_ids)
+        if not in_slice.any():
+            continue
+        stats[key] = {'tweets': int(in_slice.sum())}
+        for name, column in columns.items():
+            stats[key][name] = float(column[in_slice].sum())
+        stats[key]['exact'] = int(stats[key]['exact'])
+    return stats
@@ -0,0 +1,67 @@
+import sys
+from array import array
+from collections.abc import Sequence
+import numpy as np
+import pandas as pd
+
+class LabelArray(Sequence):
+    """
+    Append-only sequence of airline labels stored as int32 codes into a
+    vocabulary of interned strings. A run with millions of results holds
+    each distinct answer once, plus 4 bytes per row.
+    """
+
+    def __init__(self, labels=()):
+        self.vocabulary = []
+        self._codes_by_label = {}
+        self.codes = array('i')
+        self.extend(labels)
+
+    def _code(self, label):
+        if label is None:
+            return -1
+        code = self._codes_by_label.get(label)
+        if code is None:
+            code = len(self.vocabulary)
+            label = sys.intern(label)
+            self._codes_by_label[label] = code
+            self.vocabulary.append(label)
+        return code
+
+    def append(self, label):
+        self.codes.append(self._code(label))
+
+    def extend(self, labels):
+        for label in labels:
+            self.append(label)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        vocabulary = self.vocabulary
+        if isinstance(index, slice):
+            return [vocabulary[code] if code >= 0 else None for code in self.codes[index]]
+        code = self.codes[index]
+        return vocabulary[code] if code >= 0 else None
+
+    def __iter__(self):
+        vocabulary = self.vocabulary
+        return (vocabulary[code] if code >= 0 else None for code in self.codes)
+
+    def to_categorical(self):
+        """Zero-copy pandas Categorical over the codes."""
+        return pd.Categorical.from_codes(np.frombuffer(self.codes, dtype=np.int32),
+                                         categories=pd.Index(self.vocabulary, dtype=object))
+
+    def map_vocabulary(self, func):
+        """
+        Apply func once per distinct label (and once to None for missing
+        labels) and return a new LabelArray.
+        """
+        mapped = LabelArray()
+        # Missing labels have code -1, which indexes the trailing entry
+        translate = np.array([mapped._code(func(label)) for label in self.vocabulary] + [mapped._code(func(None))],
+                             dtype=np.int32)
+        mapped.codes = array('i', translate[np.frombuffer(self.codes, dtype=np.int32)].tobytes())
+        return mapped
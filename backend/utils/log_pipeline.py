@@ -0,0 +1,143 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from config import LOG_QUEUE_SIZE, LOG_EVENT_SAMPLE_RATE, PROGRESS_INTERVAL
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener = None
+_dropped = 0
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any extra= fields."""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+
+    def enqueue(self, record):
+        global _dropped
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped += 1
+
+class _ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        # Progress lines are shown as-is
+        if record.name == 'progress':
+            return record.getMessage()
+        return super().format(record)
+
+def setup_logging(log_file, console_level=logging.WARNING):
+    """
+    Route all logging through a bounded queue drained by a background thread.
+    The log file gets JSON lines; the console gets warnings and progress.
+    Callers never wait on file or terminal I/O.
+    """
+    global _listener
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setLevel(logging.INFO)
+    file_handler.setFormatter(JsonFormatter())
+
+    console_handler = logging.StreamHandler()
+    console_handler.setFormatter(_ConsoleFormatter('%(levelname)s - %(message)s'))
+    console_handler.addFilter(lambda record: record.levelno >= console_level or record.name == 'progress')
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(_DroppingQueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+def stop_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        if _dropped:
+            print(f"⚠️  {_dropped} log records were dropped because the log queue was full")
+
+def log_event(event, sample_rate=None, **fields):
+    """
+    Log a structured per-request event, keeping only a sample of them.
+    Fields end up as keys of the JSON log line.
+    """
+    rate = LOG_EVENT_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate < 1 and random.random() >= rate:
+        return
+    logging.getLogger('events').info(event, extra={'event': event, 'sample_rate': rate, **fields})
+
+class Progress:
+    """
+    Thread-safe progress counter that reports at most once per interval,
+    so concurrent workers can share it without flooding the console.
+    """
+
+    def __init__(self, description, total=None, interval=PROGRESS_INTERVAL):
+        self.description = description
+        self.total = total
+        self.interval = interval
+        self.done = 0
+        self.start = time.monotonic()
+        self.last_report = self.start
+        self.reported = False
+        self.lock = threading.Lock()
+
+    def advance(self, count=1):
+        with self.lock:
+            self.done += count
+            now = time.monotonic()
+            if now - self.last_report < self.interval:
+                return
+            self.last_report = now
+            self.reported = True
+            done = self.done
+        self._report(done, now)
+
+    def close(self):
+        """Report the final count if anything was reported before."""
+        if self.reported:
+            self._report(self.done, time.monotonic())
+
+    def _report(self, done, now):
+        rate = done / (now - self.start) if now > self.start else 0
+        total = f"/{self.total:,}" if self.total else ""
+        logging.getLogger('progress').info(f"⏳ {self.description}: {done:,}{total} ({rate:.1f}/s)",
+                                           extra={'done': done, 'total': self.total})
+
+def track(iterable, description, total=None):
+    """Iterate while reporting rate-limited progress."""
+    if total is None and hasattr(iterable, '__len__'):
+        total = len(iterable)
+    progress = Progress(description, total)
+    try:
+        for item in iterable:
+            yield item
+            progress.advance()
+    finally:
+        progress.close()
@@ -1,8 +1,66 @@
 import time
-from dataclasses import dataclass
-from typing import List
+from array import array
+from dataclasses import asdict, dataclass, field
+from typing import Dict, List
 import numpy as np
 
+# Per-tweet values are kept in packed C double arrays (8 bytes per value)
+# rather than lists of Python floats (~32 bytes per value)
+_FLOAT_COLUMNS = ('similarity_scores', 'costs', 'latencies')
+
+def _invalidates_total(method):
+    def mutate(self, *args):
+        self._total = None
+        return method(self, *args)
+    mutate.__name__ = method.__name__
+    return mutate
+
+class _Column(array):
+    """
+    Packed per-tweet float column that keeps a running sum as it grows.
+    Other in-place edits mark the sum stale; it is recomputed on next use.
+    """
+    
+    def __new__(cls, values=()):
+        column = super().__new__(cls, 'd', values)
+        column._total = None
+        return column
+    
+    def __reduce__(self):
+        return _Column, (self.tolist(),)
+    
+    @property
+    def total(self) -> float:
+        if self._total is None:
+            self._total = float(np.frombuffer(self, dtype=np.float64).sum()) if len(self) else 0.0
+        return self._total
+    
+    def append(self, value):
+        super().append(value)
+        if self._total is not None:
+            self._total += value
+    
+    def extend(self, values):
+        start = len(self)
+        super().extend(values)
+        if self._total is not None:
+            self._total += values.total if isinstance(values, _Column) else sum(self[start:])
+    
+    def __iadd__(self, values):
+        self.extend(values)
+        return self
+    
+    __setitem__ = _invalidates_total(array.__setitem__)
+    __delitem__ = _invalidates_total(array.__delitem__)
+    __imul__ = _invalidates_total(array.__imul__)
+    pop = _invalidates_total(array.pop)
+    insert = _invalidates_total(array.insert)
+    remove = _invalidates_total(array.remove)
+    fromlist = _invalidates_total(array.fromlist)
+    frombytes = _invalidates_total(array.frombytes)
+    fromfile = _invalidates_total(array.fromfile)
+    byteswap = _invalidates_total(array.byteswap)
+
 @dataclass
 class ExtractionMetrics:
     method_name: str
@@ -12,6 +70,38 @@ class ExtractionMetrics:
     exact_matches: int
     similarity_scores: List[float]
     costs: List[float]
+    stage_stats: Dict[str, dict] = field(default_factory=dict)
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    raw_tweet_tokens: int = 0
+    tweet_tokens_saved: int = 0
+    format_tokens_saved: int = 0
+    latencies: List[float] = field(default_factory=list)
+    slice_stats: Dict[str, dict] = field(default_factory=dict)
+    
+    def __setattr__(self, name, value):
+        if name in _FLOAT_COLUMNS and not isinstance(value, _Column):
+            value = _Column(value)
+        super().__setattr__(name, value)
+    
+    @property
+    def total_cost(self) -> float:
+        return self.costs.total
+    
+    def to_dict(self) -> dict:
+        """JSON-serializable form of the metrics."""
+        data = asdict(self)
+        for name in _FLOAT_COLUMNS:
+            data[name] = getattr(self, name).tolist()
+        return data
+    
+    @property
+    def cache_hit_rate(self) -> float:
+        return (self.cached_input_tokens / self.input_tokens) * 100 if self.input_tokens > 0 else 0
+    
+    @property
+    def tweet_tokens_saved_rate(self) -> float:
+        return (self.tweet_tokens_saved / self.raw_tweet_tokens) * 100 if self.raw_tweet_tokens > 0 else 0
     
     @property
     def accuracy(self) -> float:
@@ -19,7 +109,7 @@ class ExtractionMetrics:
     
     @property
     def avg_similarity(self) -> float:
-        return np.mean(self.similarity_scores) if self.similarity_scores else 0
+        return self.similarity_scores.total / len(self.similarity_scores) if len(self.similarity_scores) else 0
     
     @property
     def avg_time_per_tweet(self) -> float:
@@ -31,7 +121,7 @@ class ExtractionMetrics:
     
     @property
     def avg_cost_per_tweet(self) -> float:
-        return np.mean(self.costs) if self.costs else 0
+        return self.costs.total / len(self.costs) if len(self.costs) else 0
     
     def format_table(self) -> str:
         """Return metrics formatted as a table string."""
@@ -47,9 +137,48 @@ class ExtractionMetrics:
    • Avg Time/Tweet:   {self.avg_time_per_tweet*1000:.1f}ms
    • Total Tokens:     {self.total_tokens:,}
    • Avg Tokens/Tweet: {self.avg_tokens_per_tweet:.1f}
+   • Cached Input:     {self.cached_input_tokens:,}/{self.input_tokens:,} ({self.cache_hit_rate:.1f}%)
+   • Tweet Tokens Cut: {self.tweet_tokens_saved:,}/{self.raw_tweet_tokens:,} ({self.tweet_tokens_saved_rate:.1f}%)
 
 💰 Cost Metrics:
-   • Total Cost:       ${sum(self.costs):.4f}
+   • Total Cost:       ${self.total_cost:.4f}
    • Avg Cost/Tweet:   ${self.avg_cost_per_tweet:.4f}
-{'=' * 50}
-"""
\ No newline at end of file
+{self.format_savings()}{self.format_stages()}{'=' * 50}
+"""
+    
+    def format_savings(self) -> str:
+        """Return tokens saved by a compact fine-tuning format, if any."""
+        if not self.format_tokens_saved:
+            return ""
+        per_tweet = self.format_tokens_saved / self.total_tweets if self.total_tweets else 0
+        return f"   • Compact Format:   {self.format_tokens_saved:,} tokens saved ({per_tweet:.1f}/tweet)\n"
+    
+    def format_slices(self, kind="airline") -> str:
+        """Return accuracy, latency and cost per slice of one kind (airline or length)."""
+        slices = {key.split('=', 1)[1]: stats for key, stats in self.slice_stats.items()
+                  if key.startswith(f"{kind}=")}
+        if not slices:
+            return ""
+        lines = [f"📂 {self.method_name} by {kind}:",
+                 f"   {'Slice':<22} {'Tweets':>7} {'Accuracy':>9} {'Similarity':>11} {'Time/Tweet':>11} {'Cost/Tweet':>11}"]
+        for name, stats in sorted(slices.items(), key=lambda item: -item[1]['tweets']):
+            tweets = stats['tweets']
+            lines.append(
+                f"   {name[:22]:<22} {tweets:>7,} {stats['exact'] / tweets * 100:>8.1f}% "
+                f"{stats['similarity'] / tweets:>10.1f}% {stats['time'] / tweets * 1000:>9.1f}ms "
+                f"{'$' + format(stats['cost'] / tweets, '.4f'):>11}"
+            )
+        return "\n".join(lines) + "\n"
+    
+    def format_stages(self) -> str:
+        """Return per-stage cascade stats, if any were recorded."""
+        if not self.stage_stats:
+            return ""
+        lines = ["", "🪜 Cascade Stages:"]
+        for stage, stats in self.stage_stats.items():
+            hit_rate = stats['accepted'] / stats['attempted'] * 100 if stats['attempted'] else 0
+            lines.append(
+                f"   • {stage:<12} {stats['accepted']}/{stats['attempted']} accepted ({hit_rate:.1f}%), "
+                f"${stats['cost']:.4f}, {stats['time']:.2f}s"
+            )
+        return "\n".join(lines) + "\n"
\ No newline at end of file
@@ -1,11 +1,31 @@
 import openai
 import logging
 import time
-from config import OPENAI_API_KEY, MODEL, TEMPERATURE
+from config import OPENAI_ENDPOINTS, MODEL, EMBEDDING_MODEL, TEMPERATURE, COSTS
 import os
+from utils.profiler import span
+from utils.hedging import Hedger
+from utils.endpoint_pool import EndpointPool
+from utils.cassette import Cassette
 
-# Initialize the client
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+# Initialize the client. Chat and embedding calls are spread over every
+# configured endpoint; other calls use the first one.
+client = EndpointPool(OPENAI_ENDPOINTS)
+
+# Set by enable_hedging()
+hedger = None
+
+def enable_hedging(**options):
+    """Hedge slow chat and embedding calls for the rest of the process."""
+    global hedger
+    hedger = Hedger(**options)
+    return hedger
+
+def enable_cassette(path, mode, speed=1.0):
+    """Record chat and embedding traffic to a cassette, or replay it offline."""
+    cassette = Cassette(path, mode, speed)
+    client.use_cassette(cassette)
+    return cassette
 
 def verify_connection():
     """Verify OpenAI API connection."""
@@ -22,16 +42,41 @@ def verify_connection():
         logging.error(f"❌ OpenAI API connection failed: {str(e)}")
         return False
 
-def get_response(prompt, return_usage=False):
+def get_response(prompt, return_usage=False, system_prompt=None):
     """Get response from OpenAI API."""
-    try:
-        response = client.chat.completions.create(
-            model=MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=TEMPERATURE
+    messages = [{"role": "user", "content": prompt}]
+    if system_prompt:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+    return get_chat_response(messages, return_usage=return_usage)
+
+def get_chat_completion(messages, model=MODEL, **kwargs):
+    """Full chat completion for a prepared list of messages, hedged when hedging is enabled."""
+    def call():
+        return client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=TEMPERATURE,
+            **kwargs
         )
+    
+    with span("api_call", hedged=hedger is not None):
+        return hedger.call(call, key=model) if hedger else call()
+
+def get_embeddings(texts, model=EMBEDDING_MODEL):
+    """Embedding response for a list of texts, hedged when hedging is enabled."""
+    def call():
+        return client.embeddings.create(input=texts, model=model)
+    
+    with span("embedding_call", batch=len(texts), hedged=hedger is not None):
+        return hedger.call(call, key=model) if hedger else call()
+
+def get_chat_response(messages, return_usage=False, model=MODEL, **kwargs):
+    """Get response from OpenAI API for a prepared list of chat messages."""
+    try:
+        response = get_chat_completion(messages, model=model, **kwargs)
         
-        result = response.choices[0].message.content.strip()
+        with span("parse_response"):
+            result = response.choices[0].message.content.strip()
         
         if return_usage:
             return result, response.usage
@@ -40,3 +85,17 @@ def get_response(prompt, return_usage=False):
     except Exception as e:
         logging.error(f"❌ Error getting response: {str(e)}")
         raise
+
+def get_cached_tokens(usage):
+    """Number of prompt tokens served from the provider's prompt cache."""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return (getattr(details, 'cached_tokens', 0) or 0) if details else 0
+
+def get_cost(usage, pricing=MODEL):
+    """Cost of a completion, billing cached prompt tokens at the cached rate."""
+    rates = COSTS[pricing]
+    cached = get_cached_tokens(usage)
+    uncached = usage.prompt_tokens - cached
+    return (uncached * rates['input'] +
+            cached * rates.get('cached_input', rates['input']) +
+            usage.completion_tokens * rates['output']) / 1000
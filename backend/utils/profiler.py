@@ -0,0 +1,141 @@
+import cProfile
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from config import LOG_DIR
+
+# Bounded so tracing can stay on for long runs; old events are dropped first
+MAX_EVENTS = 1_000_000
+SAMPLE_INTERVAL = 0.005
+
+_enabled = False
+_events = deque(maxlen=MAX_EVENTS)
+_totals = defaultdict(lambda: [0, 0])  # name -> [count, total_ns]
+_cprofile = None
+_sampler = None
+_pid = os.getpid()
+
+class _Sampler(threading.Thread):
+    """Samples the stacks of all other threads at a fixed interval."""
+
+    def __init__(self, interval):
+        super().__init__(daemon=True, name="profiler-sampler")
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+
+def enable_profiling(cprofile=False, sampling=False, interval=SAMPLE_INTERVAL):
+    """Turn on span tracing, optionally with cProfile or stack sampling."""
+    global _enabled, _cprofile, _sampler
+    _enabled = True
+    if cprofile:
+        _cprofile = cProfile.Profile()
+        _cprofile.enable()
+    if sampling:
+        _sampler = _Sampler(interval)
+        _sampler.start()
+
+def is_enabled():
+    return _enabled
+
+@contextmanager
+def span(name, **args):
+    """Time a stage. A no-op unless profiling is enabled."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter_ns() - start
+        _events.append((name, start, duration, threading.get_ident(), args or None))
+        totals = _totals[name]
+        totals[0] += 1
+        totals[1] += duration
+
+def traced(name=None):
+    """Decorator form of span()."""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def format_summary():
+    """Return per-stage timings formatted as a table string."""
+    lines = [f"{'Stage':<24} {'Calls':>8} {'Total (s)':>10} {'Avg (ms)':>10}", "-" * 55]
+    for name, (count, total_ns) in sorted(_totals.items(), key=lambda item: -item[1][1]):
+        lines.append(f"{name:<24} {count:>8} {total_ns / 1e9:>10.2f} {total_ns / count / 1e6:>10.2f}")
+    return "\n".join(lines)
+
+def write_trace(prefix="trace"):
+    """
+    Write collected spans as a Chrome trace (chrome://tracing, Perfetto) to
+    LOG_DIR, plus cProfile stats and collapsed sampled stacks if enabled.
+    Returns the trace path.
+    """
+    global _cprofile, _sampler
+    timestamp = time.strftime("%Y-%m-%d_%H-%M-%S")
+    trace_path = LOG_DIR / f"{prefix}_{timestamp}.json"
+
+    trace_events = []
+    for name, start, duration, thread_id, args in list(_events):
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": start / 1000,
+            "dur": duration / 1000,
+            "pid": _pid,
+            "tid": thread_id
+        }
+        if args:
+            event["args"] = args
+        trace_events.append(event)
+    with open(trace_path, "w") as f:
+        json.dump({"traceEvents": trace_events, "displayTimeUnit": "ms"}, f)
+    logging.info(f"Trace written to {trace_path}")
+
+    if _cprofile is not None:
+        _cprofile.disable()
+        profile_path = LOG_DIR / f"{prefix}_{timestamp}.prof"
+        _cprofile.dump_stats(profile_path)
+        logging.info(f"cProfile stats written to {profile_path}")
+        _cprofile = None
+
+    if _sampler is not None:
+        _sampler.stopped.set()
+        _sampler.join()
+        stacks_path = LOG_DIR / f"{prefix}_{timestamp}.folded"
+        with open(stacks_path, "w") as f:
+            for stack, count in _sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logging.info(f"Sampled stacks written to {stacks_path}")
+        _sampler = None
+
+    return trace_path
@@ -0,0 +1,169 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from config import RESULTS_STORE_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of one process are serialized
+    fcntl = None
+
+# Leading underscore keeps the manifest out of pyarrow dataset discovery
+MANIFEST_PATH = RESULTS_STORE_DIR / "_manifest.json"
+LOCK_PATH = RESULTS_STORE_DIR / "_manifest.lock"
+
+_thread_lock = threading.Lock()
+
+# Airline labels repeat constantly, so they are stored dictionary-encoded
+RESULTS_SCHEMA = pa.schema([
+    ('row_id', pa.int64()),
+    ('tweet', pa.string()),
+    ('expected', pa.dictionary(pa.int32(), pa.string())),
+    ('extracted', pa.dictionary(pa.int32(), pa.string())),
+    ('exact_match', pa.bool_()),
+    ('similarity', pa.float32()),
+])
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('run_id', pa.string()), ('method', pa.string())]),
+    flavor='hive'
+)
+
+def new_run_id():
+    """Create a sortable run identifier, unique even for runs started in the same second."""
+    return f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}_{uuid.uuid4().hex[:6]}"
+
+@contextmanager
+def _manifest_lock():
+    """Serialize manifest updates across threads and processes (shards, jobs, streams)."""
+    with _thread_lock:
+        if fcntl is None:
+            yield
+            return
+        RESULTS_STORE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(LOCK_PATH, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def load_manifest():
+    """Load the results store manifest."""
+    if not MANIFEST_PATH.exists():
+        return {'runs': []}
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+def _save_manifest(manifest):
+    # A private temporary file per writer; the rename is atomic
+    with tempfile.NamedTemporaryFile('w', dir=RESULTS_STORE_DIR, prefix='_manifest.', suffix='.tmp',
+                                     delete=False) as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f.name, MANIFEST_PATH)
+
+def _partition_dir(run_id, method):
+    return RESULTS_STORE_DIR / f"run_id={run_id}" / f"method={method}"
+
+def to_table(df):
+    """
+    Convert result rows to a typed Arrow table.
+    Expects columns: tweet, expected, extracted, exact_match, similarity
+    and optionally row_id.
+    """
+    df = df.copy()
+    if 'row_id' not in df.columns:
+        df['row_id'] = range(len(df))
+    df['similarity'] = df['similarity'].astype('float32')
+    df['exact_match'] = df['exact_match'].astype(bool)
+    df['extracted'] = df['extracted'].fillna('').astype(str)
+    df['expected'] = df['expected'].fillna('').astype(str)
+
+    return pa.Table.from_pandas(
+        df[[field.name for field in RESULTS_SCHEMA]],
+        schema=RESULTS_SCHEMA,
+        preserve_index=False
+    )
+
+def append_results(df, run_id, method, dataset=None):
+    """
+    Append result rows for one run and method to the store.
+    Returns the path of the written part file.
+    """
+    table = to_table(df)
+
+    partition = _partition_dir(run_id, method)
+    partition.mkdir(parents=True, exist_ok=True)
+    part_path = partition / f"part-{uuid.uuid4().hex[:12]}.parquet"
+    pq.write_table(table, part_path, compression='zstd')
+
+    with _manifest_lock():
+        manifest = load_manifest()
+        entry = next((run for run in manifest['runs']
+                      if run['run_id'] == run_id and run['method'] == method), None)
+        if entry is None:
+            entry = {
+                'run_id': run_id,
+                'method': method,
+                'dataset': str(dataset) if dataset else None,
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'rows': 0,
+                'files': []
+            }
+            manifest['runs'].append(entry)
+        entry['rows'] += table.num_rows
+        entry['files'].append(str(part_path.relative_to(RESULTS_STORE_DIR)))
+        _save_manifest(manifest)
+
+    logging.info(f"Appended {table.num_rows} results to {part_path}")
+    return part_path
+
+def latest_run_id(method=None):
+    """Return the most recent run ID, optionally for a given method."""
+    runs = [run for run in load_manifest()['runs']
+            if method is None or run['method'] == method]
+    if not runs:
+        return None
+    return max(runs, key=lambda run: run['created'])['run_id']
+
+def query_results(run_id=None, method=None, exact_match=None, columns=None):
+    """
+    Read results from the store as a DataFrame.
+    Filters are pushed down to the partition and row-group level.
+    """
+    if not MANIFEST_PATH.exists():
+        return pd.DataFrame(columns=['run_id', 'method'] + RESULTS_SCHEMA.names)
+
+    dataset = ds.dataset(RESULTS_STORE_DIR, format='parquet', partitioning=PARTITIONING)
+
+    expression = None
+    for name, value in [('run_id', run_id), ('method', method), ('exact_match', exact_match)]:
+        if value is None:
+            continue
+        condition = ds.field(name) == value
+        expression = condition if expression is None else expression & condition
+
+    table = dataset.to_table(columns=columns, filter=expression)
+    return table.to_pandas()
+
+def summarize_results(run_id=None):
+    """Per-method accuracy and similarity computed from the store."""
+    df = query_results(run_id=run_id, columns=['method', 'exact_match', 'similarity'])
+    if df.empty:
+        return df
+    summary = df.groupby('method', observed=True).agg(
+        rows=('exact_match', 'size'),
+        accuracy=('exact_match', 'mean'),
+        similarity=('similarity', 'mean')
+    ).reset_index()
+    summary['accuracy'] *= 100
+    return summary
@@ -0,0 +1,120 @@
+import logging
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+
+def wilson_interval(correct, total, z):
+    """Wilson score interval for a binomial proportion."""
+    if total == 0:
+        return 0.0, 1.0
+    p = correct / total
+    denominator = 1 + z ** 2 / total
+    center = (p + z ** 2 / (2 * total)) / denominator
+    margin = z * np.sqrt(p * (1 - p) / total + z ** 2 / (4 * total ** 2)) / denominator
+    return max(0.0, center - margin), min(1.0, center + margin)
+
+def evaluation_order(data, stratify=True, seed=0):
+    """
+    Row order for sequential evaluation. With stratify, rows are shuffled
+    within each airline label and then interleaved, so every prefix has
+    roughly the label mix of the full dataset.
+    """
+    rng = np.random.default_rng(seed)
+    if not stratify:
+        return data.index[rng.permutation(len(data))]
+
+    # Position of each row within its shuffled stratum, scaled by stratum size
+    shuffled = data.iloc[rng.permutation(len(data))]
+    rank = shuffled.groupby('airlines', sort=False).cumcount()
+    size = shuffled.groupby('airlines', sort=False)['airlines'].transform('size')
+    return shuffled.index[np.argsort(((rank + 0.5) / size).values, kind='stable')]
+
+def _combine(total, metrics):
+    if total is None:
+        return metrics
+    total.total_tokens += metrics.total_tokens
+    total.total_time += metrics.total_time
+    total.total_tweets += metrics.total_tweets
+    total.exact_matches += metrics.exact_matches
+    total.similarity_scores += metrics.similarity_scores
+    total.costs += metrics.costs
+    total.latencies += metrics.latencies
+    total.input_tokens += metrics.input_tokens
+    total.cached_input_tokens += metrics.cached_input_tokens
+    total.raw_tweet_tokens += metrics.raw_tweet_tokens
+    total.tweet_tokens_saved += metrics.tweet_tokens_saved
+    total.format_tokens_saved += metrics.format_tokens_saved
+    for totals, parts in ((total.stage_stats, metrics.stage_stats), (total.slice_stats, metrics.slice_stats)):
+        for name, stats in parts.items():
+            combined = totals.setdefault(name, dict.fromkeys(stats, 0))
+            for key, value in stats.items():
+                combined[key] += value
+    return total
+
+def run_sequential_comparison(data, methods, run_batch, confidence=0.95, batch_size=20,
+                              min_samples=30, stratify=True, seed=0):
+    """
+    Evaluate methods on growing samples until the ranking is settled.
+
+    run_batch(method, batch) must return the (results, metrics) of one
+    method on a slice of the dataset, with exact_matches filled in.
+    A method is dropped once its accuracy interval lies entirely below the
+    leader's; evaluation stops when one method is left or all remaining
+    intervals are disjoint. Intervals are Bonferroni-corrected across methods.
+    """
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / (2 * len(methods)))
+    order = evaluation_order(data, stratify=stratify, seed=seed)
+
+    all_metrics = {}
+    status = {method: 'active' for method in methods}
+    position = 0
+
+    while position < len(order):
+        active = [method for method in methods if status[method] == 'active']
+        batch = data.loc[order[position:position + batch_size]]
+        position += len(batch)
+
+        for method in active:
+            _, metrics = run_batch(method, batch)
+            all_metrics[method] = _combine(all_metrics.get(method), metrics)
+
+        if position < min_samples:
+            continue
+
+        intervals = {
+            method: wilson_interval(all_metrics[method].exact_matches, all_metrics[method].total_tweets, z)
+            for method in active
+        }
+        best_lower = max(lower for lower, _ in intervals.values())
+        for method, (_, upper) in intervals.items():
+            if upper < best_lower:
+                status[method] = f'dropped at {position}'
+                logging.info(f"Sequential eval: dropped {method} after {position} rows")
+
+        remaining = sorted((intervals[m] for m in active if status[m] == 'active'), reverse=True)
+        settled = all(lower > next_upper for (lower, _), (_, next_upper) in zip(remaining, remaining[1:]))
+        if settled:
+            break
+
+    evaluated = sum(metrics.total_tweets for metrics in all_metrics.values())
+    full_pass = len(data) * len(methods)
+    summary = pd.DataFrame([
+        {
+            'method': method,
+            'accuracy': metrics.accuracy,
+            'ci_low': wilson_interval(metrics.exact_matches, metrics.total_tweets, z)[0] * 100,
+            'ci_high': wilson_interval(metrics.exact_matches, metrics.total_tweets, z)[1] * 100,
+            'rows': metrics.total_tweets,
+            'status': status[method] if status[method] != 'active' else 'kept'
+        }
+        for method, metrics in all_metrics.items()
+    ]).sort_values('accuracy', ascending=False)
+
+    print(f"\n🧪 Sequential evaluation ({confidence:.0%} confidence)")
+    print("=" * 60)
+    print(summary.to_string(index=False, float_format=lambda x: f"{x:.1f}"))
+    print("=" * 60)
+    print(f"Evaluated {evaluated:,} of {full_pass:,} method/tweet pairs "
+          f"({(1 - evaluated / full_pass) * 100 if full_pass else 0:.1f}% of calls saved)")
+
+    return all_metrics, summary
@@ -0,0 +1,143 @@
+import json
+import logging
+import subprocess
+import sys
+from dataclasses import fields
+from pathlib import Path
+import pandas as pd
+import pyarrow.parquet as pq
+from config import OUTPUT_DIR
+from utils.data_loader import build_results_frame, save_comparison_metrics
+from utils.metrics_tracker import ExtractionMetrics
+from utils.results_store import append_results, to_table
+
+SHARDS_DIR = OUTPUT_DIR / "shards"
+
+def parse_shard(spec):
+    """Parse an 'i/N' shard spec into (index, count) with 0 <= index < count."""
+    try:
+        index, count = (int(part) for part in spec.split('/'))
+    except ValueError:
+        raise ValueError(f"Invalid shard spec '{spec}', expected i/N")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard spec '{spec}', index must be in [0, {count})")
+    return index, count
+
+def select_shard(data, index, count):
+    """
+    Rows of the dataset belonging to a shard.
+    Rows are assigned by a hash of the tweet text, which is stable across
+    processes and machines, so every shard sees the same split.
+    """
+    hashes = pd.util.hash_pandas_object(data['tweet'], index=False)
+    return data[(hashes % count).values == index]
+
+def shard_dir(run_id, index, count):
+    """Output directory of one shard."""
+    return SHARDS_DIR / run_id / f"shard-{index}-of-{count}"
+
+def write_shard(run_id, index, count, method, results, metrics, data):
+    """Write one shard's results and ExtractionMetrics for a method."""
+    directory = shard_dir(run_id, index, count)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    pq.write_table(to_table(build_results_frame(results, data)), directory / f"results_{method}.parquet")
+
+    # Row IDs keep per-tweet metrics in a global order when merging
+    with open(directory / f"metrics_{method}.json", 'w') as f:
+        json.dump({'row_ids': data.index.tolist(), 'metrics': metrics.to_dict()}, f)
+
+    logging.info(f"Shard {index}/{count} wrote {len(results)} {method} results to {directory}")
+    return directory
+
+def _merge_metrics(parts):
+    """Combine per-shard metrics, ordering per-tweet values by row ID."""
+    merged = {}
+    ordered = sorted(
+        (row_id, similarity, cost)
+        for part in parts
+        for row_id, similarity, cost in zip(part['row_ids'],
+                                            part['metrics']['similarity_scores'],
+                                            part['metrics']['costs'])
+    )
+    latencies = [latency for _, latency in sorted(
+        (row_id, latency)
+        for part in parts
+        for row_id, latency in zip(part['row_ids'], part['metrics'].get('latencies', []))
+    )]
+    summed = {'stage_stats': {}, 'slice_stats': {}}
+    for part in parts:
+        for name, totals in summed.items():
+            for key, stats in part['metrics'].get(name, {}).items():
+                combined = totals.setdefault(key, dict.fromkeys(stats, 0))
+                for stat, value in stats.items():
+                    combined[stat] += value
+
+    for field in fields(ExtractionMetrics):
+        values = [part['metrics'][field.name] for part in parts if field.name in part['metrics']]
+        if field.name == 'method_name':
+            merged[field.name] = values[0]
+        elif field.name == 'similarity_scores':
+            merged[field.name] = [similarity for _, similarity, _ in ordered]
+        elif field.name == 'costs':
+            merged[field.name] = [cost for _, _, cost in ordered]
+        elif field.name == 'latencies':
+            merged[field.name] = latencies
+        elif field.name in summed:
+            merged[field.name] = summed[field.name]
+        else:
+            # Times are summed so Time/Tweet matches an unsharded run
+            merged[field.name] = sum(values)
+    return ExtractionMetrics(**merged)
+
+def merge_shards(run_id, dataset=None):
+    """
+    Rebuild global results and summaries from all shard outputs of a run.
+    Shard directories from other machines must be copied under SHARDS_DIR/run_id first.
+    """
+    run_dir = SHARDS_DIR / run_id
+    shard_dirs = sorted(run_dir.glob("shard-*"))
+    if not shard_dirs:
+        raise FileNotFoundError(f"No shard outputs found in {run_dir}")
+
+    counts = {directory.name.rsplit('-of-', 1)[1] for directory in shard_dirs}
+    if len(counts) != 1 or len(shard_dirs) != int(counts.pop()):
+        logging.warning(f"Merging an incomplete or mixed set of shards: {[d.name for d in shard_dirs]}")
+
+    methods = sorted({path.stem[len("metrics_"):] for d in shard_dirs for path in d.glob("metrics_*.json")})
+    all_metrics = {}
+    for method in methods:
+        parts = []
+        for directory in shard_dirs:
+            metrics_file = directory / f"metrics_{method}.json"
+            if metrics_file.exists():
+                with open(metrics_file) as f:
+                    parts.append(json.load(f))
+        all_metrics[method] = _merge_metrics(parts)
+
+        results = pd.concat(
+            [pd.read_parquet(directory / f"results_{method}.parquet")
+             for directory in shard_dirs if (directory / f"results_{method}.parquet").exists()],
+            ignore_index=True
+        ).sort_values('row_id', kind='stable')
+        append_results(results, run_id, method, dataset=dataset)
+
+    summary_path = save_comparison_metrics(all_metrics)
+    print(f"\n✅ Merged {len(shard_dirs)} shards for run {run_id}")
+    return all_metrics, summary_path
+
+def launch_local_shards(argv, workers, run_id, dataset=None):
+    """
+    Run main.py once per shard in a local process pool, then merge the
+    shards of the dataset. Returns the merged metrics.
+    """
+    main_script = Path(__file__).parent.parent / "main.py"
+    processes = [
+        subprocess.Popen([sys.executable, str(main_script), *argv,
+                          '--shard', f"{index}/{workers}", '--run-id', run_id])
+        for index in range(workers)
+    ]
+    failed = [index for index, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        raise RuntimeError(f"Shards {failed} failed")
+    return merge_shards(run_id, dataset=dataset)
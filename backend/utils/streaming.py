@@ -0,0 +1,233 @@
+import heapq
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from config import OUTPUT_DIR
+from utils.canonicalize import canonicalize
+
+POLL_INTERVAL = 0.2
+# Seconds to wait for in-flight tweets after Ctrl-C
+STOP_TIMEOUT = 30.0
+# Results are fsynced (and the checkpoint saved) after this many records or seconds
+SYNC_EVERY = 100
+SYNC_INTERVAL = 1.0
+# Latencies kept for the percentile summary (a uniform sample of all records)
+LATENCY_SAMPLE_SIZE = 10_000
+_DONE = object()
+
+class _Checkpoint:
+    """
+    Tracks the input offset below which every record has been written.
+    Records finish out of order, so the watermark only advances over a
+    contiguous run of completed offsets.
+    """
+
+    def __init__(self, path, start):
+        self.path = path
+        self.watermark = start
+        self.pending = []
+        self.completed = set()
+        self.lock = threading.Lock()
+
+    def started(self, offset, next_offset):
+        with self.lock:
+            heapq.heappush(self.pending, (offset, next_offset))
+
+    def finished(self, offset):
+        with self.lock:
+            self.completed.add(offset)
+            while self.pending and self.pending[0][0] in self.completed:
+                done, next_offset = heapq.heappop(self.pending)
+                self.completed.discard(done)
+                self.watermark = next_offset
+
+    def save(self):
+        if self.path is None:
+            return
+        with self.lock:
+            watermark = self.watermark
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(str(watermark))
+        tmp_path.replace(self.path)
+
+def _read_records(source, start_offset, follow, stop):
+    """Yield (offset, next_offset, record) for each NDJSON line of the source."""
+    if source == '-':
+        stream = sys.stdin.buffer
+        offset = 0
+    else:
+        stream = open(source, 'rb')
+        if start_offset and stream.seekable():
+            stream.seek(start_offset)
+        offset = stream.tell() if stream.seekable() else 0
+
+    partial = b''
+    try:
+        while not stop.is_set():
+            line = stream.readline()
+            if not line:
+                if follow:
+                    time.sleep(POLL_INTERVAL)
+                    continue
+                break
+            if not line.endswith(b'\n') and follow:
+                # Wait for the writer to finish the line
+                partial += line
+                continue
+            line, partial = partial + line, b''
+            next_offset = offset + len(line)
+            text = line.strip()
+            if text:
+                try:
+                    yield offset, next_offset, json.loads(text)
+                except json.JSONDecodeError:
+                    logging.warning(f"Skipping malformed line at offset {offset}")
+            offset = next_offset
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+def run_stream(source, extract_batch, output_path=None, max_in_flight=32, workers=4, follow=False):
+    """
+    Extract airlines from a stream of NDJSON records ({"id": ..., "tweet": ...}).
+
+    A reader thread feeds a bounded queue, so reading blocks (and upstream
+    writers stall) when extraction falls behind. Each result is written and
+    flushed as it completes, and fsynced in batches of SYNC_EVERY records or
+    SYNC_INTERVAL seconds. For regular files the input offset of the last
+    synced record is checkpointed after each fsync and a restart resumes
+    from it, so every record is written at least once.
+    """
+    output_path = Path(output_path) if output_path else OUTPUT_DIR / "stream_results.jsonl"
+    seekable = source != '-' and Path(source).is_file()
+    checkpoint_path = output_path.with_suffix('.offset') if seekable else None
+    start_offset = int(checkpoint_path.read_text()) if checkpoint_path and checkpoint_path.exists() else 0
+    if start_offset:
+        logging.info(f"Resuming {source} from offset {start_offset}")
+
+    inbox = queue.Queue(maxsize=max_in_flight)
+    stop = threading.Event()
+
+    def put(item):
+        # Gives up once stopped, so a full queue can't block shutdown
+        while not stop.is_set():
+            try:
+                inbox.put(item, timeout=POLL_INTERVAL)
+                return
+            except queue.Full:
+                continue
+    checkpoint = _Checkpoint(checkpoint_path, start_offset)
+    write_lock = threading.Lock()
+    latencies = []
+    processed = 0
+    unsynced = 0
+    last_sync = time.monotonic()
+
+    def sync(output, force=False):
+        # Caller holds write_lock, so every finished record is already written
+        nonlocal unsynced, last_sync
+        if not unsynced or (not force and unsynced < SYNC_EVERY
+                            and time.monotonic() - last_sync < SYNC_INTERVAL):
+            return
+        os.fsync(output.fileno())
+        checkpoint.save()
+        unsynced, last_sync = 0, time.monotonic()
+
+    def reader():
+        try:
+            for offset, next_offset, record in _read_records(source, start_offset, follow, stop):
+                checkpoint.started(offset, next_offset)
+                # Blocks while the queue is full, which is the backpressure
+                put((offset, record, time.perf_counter()))
+        finally:
+            for _ in range(workers):
+                put(_DONE)
+
+    def worker(output):
+        nonlocal processed, unsynced
+        # After Ctrl-C, queued records are left for the next run to resume
+        while not stop.is_set():
+            try:
+                item = inbox.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                # Sync results that arrived just before the stream went quiet
+                with write_lock:
+                    sync(output)
+                continue
+            if item is _DONE:
+                return
+            offset, record, received = item
+            record_id = offset
+            try:
+                if not isinstance(record, dict):
+                    raise ValueError(f"expected a JSON object, got {type(record).__name__}")
+                record_id = record.get('id', offset)
+                tweet = record.get('tweet', record.get('text', ''))
+                results, _ = extract_batch([tweet])
+                raw = results[0]
+                error = None
+            except Exception as e:
+                logging.error(f"Error processing record at offset {offset}: {str(e)}")
+                raw, error = None, str(e)
+            latency = time.perf_counter() - received
+
+            line = json.dumps({
+                'id': record_id,
+                'airlines': canonicalize(raw) if raw is not None else None,
+                'raw': raw,
+                'error': error,
+                'latency_ms': round(latency * 1000, 1)
+            })
+            with write_lock:
+                output.write(line + '\n')
+                output.flush()
+                processed += 1
+                unsynced += 1
+                # Reservoir sample, so memory stays bounded on endless streams
+                if len(latencies) < LATENCY_SAMPLE_SIZE:
+                    latencies.append(latency)
+                else:
+                    slot = random.randrange(processed)
+                    if slot < LATENCY_SAMPLE_SIZE:
+                        latencies[slot] = latency
+                checkpoint.finished(offset)
+                sync(output)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'a') as output:
+        threads = [threading.Thread(target=worker, args=(output,), daemon=True) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        reader_thread = threading.Thread(target=reader, daemon=True)
+        reader_thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=1.0)
+        except KeyboardInterrupt:
+            print("\n⏹️  Stopping stream, finishing in-flight tweets...")
+            stop.set()
+            # The reader may be stuck in readline() on stdin or a FIFO; it is a
+            # daemon and is left behind
+            deadline = time.monotonic() + STOP_TIMEOUT
+            for thread in threads:
+                thread.join(timeout=max(0.0, deadline - time.monotonic()))
+            if any(thread.is_alive() for thread in threads):
+                logging.warning("Stream workers still busy after stop timeout; exiting anyway")
+        finally:
+            with write_lock:
+                sync(output, force=True)
+
+    if latencies:
+        print(f"\n📡 Stream processed {processed} tweets -> {output_path}")
+        print(f"   • Latency p50: {np.percentile(latencies, 50) * 1000:.0f}ms, "
+              f"p95: {np.percentile(latencies, 95) * 1000:.0f}ms")
+    return processed
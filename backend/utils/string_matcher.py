@@ -1,5 +1,8 @@
 from difflib import SequenceMatcher
 
+# Bump whenever scoring changes so stored evaluations are recomputed
+SCORER_VERSION = 2
+
 def get_string_similarity(a: str, b: str) -> float:
     """Calculate similarity ratio between two strings."""
     if not a or not b:
@@ -11,7 +14,8 @@ def match_airline_name(extracted: str, expected: str) -> tuple[bool, float]:
     Match airline names and return both exact match and similarity score.
     Returns (is_exact_match, similarity_percentage)
     """
-    if not extracted or not expected:
+    # A failed extraction (None or missing) is always wrong
+    if not isinstance(extracted, str) or not isinstance(expected, str) or not extracted or not expected:
         return False, 0.0
         
     # Check for exact match first
@@ -0,0 +1,36 @@
+import json
+import logging
+from datetime import datetime
+from config import DEFAULT_TUNING, TUNING_PROFILE_PATH, MODEL
+
+_settings = dict(DEFAULT_TUNING)
+
+def get_tuning():
+    """Throughput settings currently in effect."""
+    return _settings
+
+def load_tuning_profile(path=TUNING_PROFILE_PATH):
+    """Apply the settings of a saved tuning profile, if there is one."""
+    if not path.exists():
+        return None
+    with open(path) as f:
+        profile = json.load(f)
+    if profile.get('model') != MODEL:
+        logging.warning(f"Tuning profile was made for {profile.get('model')}, not {MODEL}; run --autotune again")
+    _settings.update({key: value for key, value in profile['settings'].items() if key in DEFAULT_TUNING})
+    logging.info(f"Loaded tuning profile {path}: {_settings}")
+    return profile
+
+def save_tuning_profile(settings, measurements, endpoints, path=TUNING_PROFILE_PATH):
+    """Write chosen settings and the probes behind them."""
+    profile = {
+        'model': MODEL,
+        'endpoints': endpoints,
+        'tuned': datetime.now().isoformat(timespec='seconds'),
+        'settings': settings,
+        'measurements': measurements
+    }
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+    _settings.update(settings)
+    return path
@@ -50,7 +50,7 @@ if [ "$DATASET" = "manual entry" ]; then
     echo "✅ Selected method: ${YELLOW}$METHOD${RESET}"
     
     # Handle fine-tuned model selection if needed
-    if [ "$METHOD" = "fine-tuned" ] || [ "$METHOD" = "compare-all" ]; then
+    if [ "$METHOD" = "fine-tuned" ] || [ "$METHOD" = "cascade" ] || [ "$METHOD" = "compare-all" ]; then
         echo "${CYAN}🤖 Fine-tuned Model Options:${RESET}"
         
         # Get available models from OpenAI
@@ -93,7 +93,7 @@ else
 
     # Handle fine-tuned model selection/creation
     MODEL_ID=""
-    if [ "$METHOD" = "fine-tuned" ] || [ "$METHOD" = "compare-all" ]; then
+    if [ "$METHOD" = "fine-tuned" ] || [ "$METHOD" = "cascade" ] || [ "$METHOD" = "compare-all" ]; then
         echo "${CYAN}🤖 Fine-tuned Model Options:${RESET}"
         
         # Get available models from OpenAI
@@ -130,17 +130,17 @@ fi
 echo "${GREEN}✅ Extraction completed${RESET}"
 echo "📝 Log file: $LOG_FILE"
 
-# Check if output directory and results file exist
+# Check if output directory and results store have a run
 OUTPUT_DIR="$SCRIPT_DIR/output"
-RESULTS_FILE=$(ls -t "$OUTPUT_DIR"/results_${METHOD}_*.csv 2>/dev/null | head -n1)
+RUN_ID=$(python -c "from utils.results_store import latest_run_id; print(latest_run_id() or '')")
 
 if [ ! -d "$OUTPUT_DIR" ]; then
     echo "${YELLOW}Creating output directory...${RESET}"
     mkdir -p "$OUTPUT_DIR"
 fi
 
-if [ ! -f "$RESULTS_FILE" ]; then
-    echo "${YELLOW}❌ No results file was generated${RESET}"
+if [ -z "$RUN_ID" ]; then
+    echo "${YELLOW}❌ No results were generated${RESET}"
     exit 1
 fi
 
@@ -197,11 +197,11 @@ case "$CHOICE" in
                 echo "${YELLOW}❌ No comparison results found${RESET}"
             fi
         else
-            RESULTS_FILE=$(ls -t "$OUTPUT_DIR"/results_${METHOD}_*.csv 2>/dev/null | head -n1)
-            if [ -f "$RESULTS_FILE" ]; then
-                column -s, -t < "$RESULTS_FILE" | less -R
+            RESULTS=$(python -c "from utils.results_store import query_results; print(query_results(run_id='$RUN_ID', method='$METHOD').to_string(index=False))")
+            if [ -n "$RESULTS" ]; then
+                echo "$RESULTS" | less -R
             else
-                echo "${YELLOW}❌ No results file found${RESET}"
+                echo "${YELLOW}❌ No results found${RESET}"
             fi
         fi
         ;;